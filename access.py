@@ -0,0 +1,101 @@
+"""
+Teacher access sets from Teaches.
+
+A teacher's access set is the courses they teach and, per course, the
+sections (a Teaches row with no section covers every section). It is
+built with one query per teacher and kept in ``cache.results``, so it is
+shared by every request and session of that teacher and rebuilt only after
+Teaches changes.
+
+Pages opt in with ``?scope=mine``; the filters below then narrow their
+queries to the teacher's own slice.
+"""
+from collections import namedtuple
+
+from flask import g, request
+from sqlalchemy import false, or_, true, tuple_
+
+from models import db, Student, Teaches, Marks
+import cache
+
+Access = namedtuple("Access", "courses slots whole_courses classes")
+# courses        every course code taught
+# slots          (course_code, section) pairs
+# whole_courses  course codes taught to every section
+# classes        (sem, section) pairs, for student lists (None: any)
+
+
+def _build(tid):
+    courses, slots, whole, classes = set(), set(), set(), set()
+    rows = db.session.query(
+        Teaches.course_code, Teaches.sem, Teaches.section
+    ).filter(Teaches.tid == tid)
+    for code, sem, section in rows:
+        courses.add(code)
+        if section:
+            slots.add((code, section))
+            classes.add((sem, section))
+        else:
+            whole.add(code)
+            classes.add((sem, None))
+    return Access(frozenset(courses), frozenset(slots),
+                  frozenset(whole), frozenset(classes))
+
+
+def for_teacher(tid):
+    return cache.results.get(("access", str(tid)), ("teaches",),
+                             lambda: _build(tid))
+
+
+def scoped():
+    """True when the page was asked for the teacher's own slice."""
+    return request.args.get("scope") == "mine"
+
+
+def current():
+    """Access set of the logged-in teacher (see sessions.current_teacher)."""
+    teacher = g.get("teacher")
+    if teacher is None:
+        return Access(frozenset(), frozenset(), frozenset(), frozenset())
+    return for_teacher(teacher.tid)
+
+
+def marks_filter(access):
+    """Marks rows (joined to Student) inside the access set."""
+    clauses = []
+    if access.whole_courses:
+        clauses.append(Marks.course_code.in_(access.whole_courses))
+    if access.slots:
+        clauses.append(
+            tuple_(Marks.course_code, Student.section).in_(access.slots)
+        )
+    return or_(*clauses) if clauses else false()
+
+
+def students_filter(access):
+    """
+    Students in a class the teacher teaches. A Teaches row with no sem
+    (legacy rows) covers that section in every semester; with neither sem
+    nor section, every student.
+    """
+    if (None, None) in access.classes:
+        return true()
+    clauses = []
+    whole_sems = {sem for sem, section in access.classes
+                  if section is None and sem is not None}
+    if whole_sems:
+        clauses.append(Student.sem.in_(whole_sems))
+    any_sem = {section for sem, section in access.classes
+               if sem is None and section}
+    if any_sem:
+        clauses.append(Student.section.in_(any_sem))
+    pairs = {(sem, section) for sem, section in access.classes
+             if sem is not None and section}
+    if pairs:
+        clauses.append(tuple_(Student.sem, Student.section).in_(pairs))
+    return or_(*clauses) if clauses else false()
+
+
+def allows(access, course_code, section):
+    return (course_code in access.whole_courses
+            or (course_code, section) in access.slots)
@@ -0,0 +1,195 @@
+"""
+Score distributions for the band analysis page.
+
+One pass over marks (joined to student for sem / section) feeds an
+accumulator per course, per (course, section) and per teacher. Teachers
+are matched to rows through Teaches on (course_code, section), loaded once
+up front, so there is no query per slice. Each slice reports count, mean,
+median, standard deviation, percentiles, min / max, band counts, a
+histogram of totals and the average IA1 -> IA3 trend.
+
+Results are memoized per (sem, section, course) in ``cache.results`` and
+recomputed only after marks, students or teaching assignments change. With
+``archived`` the same queries read the archived semesters (see archive.py).
+"""
+import math
+from collections import defaultdict
+
+from sqlalchemy import or_, select
+
+from models import db, Student, Teacher, Teaches, Marks
+import bulk
+import archive
+import cache
+
+PERCENTILES = (10, 25, 75, 90)
+MAX_TOTAL = bulk.IA_MAX + bulk.ASSIGNMENT_MAX
+HIST_WIDTH = 5
+# 0-4, 5-9, ... 45-50: the last bucket also takes a perfect score
+HIST_LABELS = [
+    f"{lo}-{lo + HIST_WIDTH - 1 if lo + HIST_WIDTH < MAX_TOTAL else MAX_TOTAL}"
+    for lo in range(0, MAX_TOTAL, HIST_WIDTH)
+]
+
+TABLES = ("marks", "student", "teaches", "teacher")
+
+
+def percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    if lo == hi:
+        return sorted_values[int(k)]
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Slice:
+    __slots__ = ("totals", "ia_sums", "bands")
+
+    def __init__(self):
+        self.totals = []
+        self.ia_sums = [0, 0, 0]
+        self.bands = {"green": 0, "yellow": 0, "red": 0}
+
+    def add(self, ia1, ia2, ia3, total, category):
+        self.totals.append(total)
+        self.ia_sums[0] += ia1 or 0
+        self.ia_sums[1] += ia2 or 0
+        self.ia_sums[2] += ia3 or 0
+        if category in self.bands:
+            self.bands[category] += 1
+
+    def summary(self):
+        values = sorted(self.totals)
+        n = len(values)
+        if not n:
+            return {"count": 0}
+        mean = sum(values) / n
+        variance = sum((v - mean) ** 2 for v in values) / n
+
+        hist = [0] * len(HIST_LABELS)
+        for v in values:
+            hist[min(max(v, 0) // HIST_WIDTH, len(hist) - 1)] += 1
+
+        out = {
+            "count": n,
+            "mean": round(mean, 2),
+            "median": round(percentile(values, 50), 2),
+            "std": round(math.sqrt(variance), 2),
+            "min": values[0],
+            "max": values[-1],
+            "bands": dict(self.bands),
+            "histogram": hist,
+            "trend": [round(s / n, 2) for s in self.ia_sums],
+        }
+        for p in PERCENTILES:
+            out[f"p{p}"] = round(percentile(values, p), 2)
+        return out
+
+
+def _teachers_by_slot(sem=None, section=None, course=None, archived=False):
+    """
+    (course_code, section) -> [(tid, teacher_name)] from Teaches. A row
+    with no section is keyed (course_code, None) and covers every section;
+    a row with no sem matches any semester (as in access.py).
+    """
+    query = (
+        db.session.query(Teaches.course_code, Teaches.section,
+                         Teaches.tid, Teacher.teacher_name)
+        .join(Teacher, Teacher.tid == Teaches.tid)
+    )
+    if sem:
+        query = query.filter(or_(Teaches.sem == sem, Teaches.sem.is_(None)))
+    if section:
+        query = query.filter(
+            or_(Teaches.section == section, Teaches.section.is_(None))
+        )
+    if course:
+        query = query.filter(Teaches.course_code == course)
+    if archived:
+        query = archive.translate(query)
+
+    slots = defaultdict(list)
+    for code, sec, tid, name in query:
+        slots[(code, sec)].append((tid, name))
+    return slots
+
+
+def compute(sem=None, section=None, course=None, archived=False):
+    stmt = (
+        select(Marks.course_code, Student.section, Marks.ia1, Marks.ia2,
+               Marks.ia3, Marks.total_score, Marks.category)
+        .join(Student, Student.usn == Marks.usn)
+        .where(Marks.total_score.is_not(None))
+    )
+    if sem:
+        stmt = stmt.where(Student.sem == sem)
+    if section:
+        stmt = stmt.where(Student.section == section)
+    if course:
+        stmt = stmt.where(Marks.course_code == course)
+
+    if archived:
+        stmt = archive.translate(stmt)
+
+    slots = _teachers_by_slot(sem, section, course, archived)
+    overall = Slice()
+    courses = defaultdict(Slice)
+    sections = defaultdict(Slice)
+    teachers = defaultdict(Slice)
+
+    result = db.session.execute(stmt.execution_options(yield_per=2000))
+    for code, sec, ia1, ia2, ia3, total, category in result:
+        row = (ia1, ia2, ia3, total, category)
+        overall.add(*row)
+        courses[code].add(*row)
+        sections[(code, sec)].add(*row)
+        # the section's own teachers, then whole-course ones
+        taught_by = slots.get((code, sec), []) + slots.get((code, None), [])
+        for teacher in taught_by:
+            teachers[(teacher, code, sec)].add(*row)
+
+    teacher_rows = []
+    for key in sorted(teachers, key=lambda k: (k[0][1], k[1], k[2] or "")):
+        (tid, name), code, sec = key
+        teacher_rows.append(dict(
+            tid=tid, teacher_name=name, course_code=code, section=sec,
+            **teachers[key].summary()
+        ))
+
+    return {
+        "overall": overall.summary(),
+        "courses": [
+            dict(course_code=code, **courses[code].summary())
+            for code in sorted(courses)
+        ],
+        "sections": [
+            dict(course_code=code, section=sec, **sections[(code, sec)].summary())
+            for code, sec in sorted(sections, key=lambda k: (k[0], k[1] or ""))
+        ],
+        "teachers": teacher_rows,
+        "histogram_labels": HIST_LABELS,
+        "percentiles": list(PERCENTILES),
+    }
+
+
+def get(sem=None, section=None, course=None, archived=False):
+    """
+    Memoized ``compute()``; recomputed only after the tables change. A
+    whole archived semester is served from the summary recorded when it
+    was archived (see archive.py).
+    """
+    def load():
+        if archived and sem and not (section or course):
+            stored = archive.stored_analytics(sem)
+            if stored is not None:
+                return stored
+        return compute(sem, section, course, archived)
+
+    return cache.results.get(
+        ("analytics", sem, section, course, archived),
+        archive.TABLES if archived else TABLES,
+        load
+    )
@@ -0,0 +1,449 @@
+"""
+Versioned JSON API for scripts and the department portal.
+
+    GET /api/v1/students       ?sem ?section ?course ?band
+    GET /api/v1/students/<usn> rollup summary of one student
+    GET /api/v1/rankings       ?sem (required) ?section ?limit
+    GET /api/v1/marks          ?usn ?sem ?section ?course ?band
+    GET /api/v1/marks.ndjson   same filters, whole result streamed
+    GET /api/v1/marks/changes  ?since ?limit ?usn ?course  (marks_log)
+    GET /api/v1/supplementary  ?teacher ?course ?sem
+    GET /api/v1/teaches        ?teacher ?course ?sem ?section
+    POST /api/v1/teaches       {"assignments": [{tid, course_code, sem, section}]}
+    GET /api/v1/bands          ?sem ?course
+    GET /api/v1/analytics      ?sem ?section ?course
+
+List endpoints are keyset paginated (``per_page``, ``after`` / ``before``
+cursors, see pagination.py). Every response carries a weak ETag built from
+the table_version counters of the tables it reads, so an unchanged
+``If-None-Match`` is answered with 304 before any query runs. Bodies are
+gzip-compressed when the client accepts it; the NDJSON export is compressed
+as it streams.
+
+POST /api/v1/teaches writes a whole batch or nothing: it answers 201 with
+the number of rows created, or 400 with every rejected row (see
+``bulk.validate_teaches_rows``).
+"""
+import functools
+import hashlib
+import json
+import zlib
+
+from flask import (
+    Blueprint, Response, abort, jsonify, request, stream_with_context
+)
+from sqlalchemy import func, select
+
+from models import db, Student, Teacher, Teaches, Marks, Supplementary
+from pagination import paginate, per_page_arg
+import analytics
+import bulk
+import cache
+import changelog
+import rollup
+import stats
+
+BANDS = ("green", "yellow", "red")
+GZIP_MIN_BYTES = 1024
+EXPORT_BATCH = 1000
+
+bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+
+class BadRequest(Exception):
+    pass
+
+
+@bp.errorhandler(BadRequest)
+def _bad_request(exc):
+    return jsonify(error=str(exc)), 400
+
+
+@bp.errorhandler(404)
+def _not_found(exc):
+    return jsonify(error="not found"), 404
+
+
+def filters():
+    band = request.args.get("band") or None
+    if band is not None and band not in BANDS:
+        raise BadRequest(f"band must be one of {', '.join(BANDS)}")
+    return {
+        "usn": request.args.get("usn") or None,
+        "sem": request.args.get("sem", type=int),
+        "section": request.args.get("section") or None,
+        "course": request.args.get("course") or None,
+        "teacher": request.args.get("teacher") or None,
+        "band": band,
+    }
+
+
+# ---------------------------------------------------
+# ETAG + GZIP
+# ---------------------------------------------------
+def _etag(tables):
+    raw = f"{request.full_path}|{cache.versions(*tables)}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def conditional(tables):
+    """
+    Answer 304 straight away if the client's copy is still current.
+
+    Otherwise run the view and tag its response. ``tables`` are the tables
+    the view reads; a write to any of them changes the tag.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = _etag(tables)
+            if request.if_none_match.contains_weak(etag):
+                resp = Response(status=304)
+            else:
+                resp = view(*args, **kwargs)
+            resp.set_etag(etag, weak=True)
+            resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
+        return wrapper
+    return decorator
+
+
+def _gzip_stream(chunks):
+    z = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = z.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield z.flush()
+
+
+@bp.after_request
+def _compress(response):
+    response.vary.add("Accept-Encoding")
+    if (response.status_code != 200
+            or "Content-Encoding" in response.headers
+            or not request.accept_encodings.quality("gzip")):
+        return response
+
+    if response.is_streamed:
+        response.response = _gzip_stream(response.response)
+        response.headers.pop("Content-Length", None)
+    else:
+        body = response.get_data()
+        if len(body) < GZIP_MIN_BYTES:
+            return response
+        z = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        response.set_data(z.compress(body) + z.flush())
+    response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def _page_json(page, row_to_dict):
+    return jsonify(
+        items=[row_to_dict(r) for r in page.items],
+        next=page.next_cursor,
+        prev=page.prev_cursor,
+        next_url=page.next_url,
+        prev_url=page.prev_url,
+    )
+
+
+# ---------------------------------------------------
+# STUDENTS
+# ---------------------------------------------------
+@bp.route("/students")
+@conditional(("student", "marks"))
+def students():
+    f = filters()
+    query = db.session.query(
+        Student.usn, Student.student_name, Student.sem, Student.section
+    )
+    if f["sem"]:
+        query = query.filter(Student.sem == f["sem"])
+    if f["section"]:
+        query = query.filter(Student.section == f["section"])
+    if f["course"] or f["band"]:
+        has_marks = db.session.query(Marks).filter(Marks.usn == Student.usn)
+        if f["course"]:
+            has_marks = has_marks.filter(Marks.course_code == f["course"])
+        if f["band"]:
+            has_marks = has_marks.filter(Marks.category == f["band"])
+        query = query.filter(has_marks.exists())
+
+    page = paginate(
+        query, [Student.usn], lambda r: (r.usn,),
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page_arg()
+    )
+    return _page_json(page, lambda r: dict(r._mapping))
+
+
+ROLLUP_TABLES = ("student", "marks", "supplementary", "course")
+
+
+@bp.route("/students/<usn>")
+@conditional(ROLLUP_TABLES)
+def student(usn):
+    hit = rollup.get(usn)
+    if hit is None:
+        abort(404)
+    summary, name = hit
+    rank = rollup.rank_of(summary)
+    out = rollup.as_dict(summary, name)
+    out["rank"], out["ranked"] = rank if rank else (None, None)
+    return jsonify(out)
+
+
+@bp.route("/rankings")
+@conditional(ROLLUP_TABLES)
+def rankings():
+    f = filters()
+    if not f["sem"]:
+        raise BadRequest("sem is required")
+    limit = request.args.get("limit", type=int)
+    rows = rollup.ranking(f["sem"], f["section"], limit)
+    return jsonify(
+        sem=f["sem"],
+        section=f["section"],
+        students=[rollup.as_dict(r, name, rank) for rank, r, name in rows],
+    )
+
+
+# ---------------------------------------------------
+# MARKS
+# ---------------------------------------------------
+MARK_COLUMNS = (
+    Marks.usn, Student.student_name, Student.sem, Student.section,
+    Marks.course_code, Marks.ia1, Marks.ia2, Marks.ia3, Marks.assignment,
+    Marks.total_score, Marks.category,
+)
+
+
+def _filter_marks(stmt, f):
+    if f["usn"]:
+        stmt = stmt.filter(Marks.usn == f["usn"])
+    if f["sem"]:
+        stmt = stmt.filter(Student.sem == f["sem"])
+    if f["section"]:
+        stmt = stmt.filter(Student.section == f["section"])
+    if f["course"]:
+        stmt = stmt.filter(Marks.course_code == f["course"])
+    if f["band"]:
+        stmt = stmt.filter(Marks.category == f["band"])
+    return stmt
+
+
+@bp.route("/marks")
+@conditional(("student", "marks"))
+def marks():
+    query = _filter_marks(
+        db.session.query(*MARK_COLUMNS).join(Student, Student.usn == Marks.usn),
+        filters()
+    )
+    page = paginate(
+        query, [Marks.usn, Marks.course_code],
+        lambda r: (r.usn, r.course_code),
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page_arg()
+    )
+    return _page_json(page, lambda r: dict(r._mapping))
+
+
+@bp.route("/marks.ndjson")
+@conditional(("student", "marks"))
+def marks_export():
+    """Every matching row, one JSON object per line, fetched in batches."""
+    stmt = _filter_marks(
+        select(*MARK_COLUMNS).join(Student, Student.usn == Marks.usn),
+        filters()
+    ).order_by(Marks.usn, Marks.course_code)
+
+    def generate():
+        result = db.session.execute(
+            stmt.execution_options(yield_per=EXPORT_BATCH)
+        )
+        for rows in result.partitions():
+            yield "".join(
+                json.dumps(dict(r._mapping), separators=(",", ":")) + "\n"
+                for r in rows
+            )
+
+    return Response(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
+
+
+@bp.route("/marks/changes")
+@conditional(("marks",))
+def marks_changes():
+    """Change log entries after ``since``; poll again with ``last_seq``."""
+    since = request.args.get("since", 0, type=int)
+    limit = request.args.get("limit", 500, type=int)
+    f = filters()
+    entries = changelog.changes_since(since, limit, f["usn"], f["course"])
+    return jsonify(
+        changes=[changelog.as_dict(e) for e in entries],
+        last_seq=entries[-1].seq if entries else since,
+    )
+
+
+# ---------------------------------------------------
+# SUPPLEMENTARY
+# ---------------------------------------------------
+def supplementary_query(f):
+    """Supplementary rows with student and teacher names, filtered."""
+    query = (
+        db.session.query(
+            Supplementary.usn,
+            Student.student_name,
+            Supplementary.course_code,
+            Supplementary.teacher_id,
+            Teacher.teacher_name,
+        )
+        .join(Student, Student.usn == Supplementary.usn)
+        .join(Teacher, Teacher.tid == Supplementary.teacher_id, isouter=True)
+    )
+    if f["teacher"]:
+        query = query.filter(Supplementary.teacher_id == f["teacher"])
+    if f["course"]:
+        query = query.filter(Supplementary.course_code == f["course"])
+    if f["sem"]:
+        query = query.filter(Student.sem == f["sem"])
+    return query
+
+
+@bp.route("/supplementary")
+@conditional(("student", "teacher", "supplementary"))
+def supplementary():
+    f = filters()
+    page = paginate(
+        supplementary_query(f),
+        [Supplementary.usn, Supplementary.course_code, Supplementary.teacher_id],
+        lambda r: (r.usn, r.course_code, r.teacher_id),
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page_arg()
+    )
+    return _page_json(page, lambda r: dict(r._mapping))
+
+
+# ---------------------------------------------------
+# TEACHES
+# ---------------------------------------------------
+def teaches_query(f):
+    """Teaches rows with teacher names, filtered."""
+    query = (
+        db.session.query(
+            Teaches.tid,
+            Teacher.teacher_name,
+            Teaches.course_code,
+            Teaches.sem,
+            Teaches.section,
+        )
+        .join(Teacher, Teacher.tid == Teaches.tid, isouter=True)
+    )
+    if f["teacher"]:
+        query = query.filter(Teaches.tid == f["teacher"])
+    if f["course"]:
+        query = query.filter(Teaches.course_code == f["course"])
+    if f["sem"]:
+        query = query.filter(Teaches.sem == f["sem"])
+    if f["section"]:
+        query = query.filter(Teaches.section == f["section"])
+    return query
+
+
+@bp.route("/teaches")
+@conditional(("teacher", "teaches"))
+def teaches():
+    f = filters()
+    page = paginate(
+        teaches_query(f), [Teaches.tid, Teaches.course_code],
+        lambda r: (r.tid, r.course_code),
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page_arg()
+    )
+    return _page_json(page, lambda r: dict(r._mapping))
+
+
+@bp.route("/teaches", methods=["POST"])
+def assign_teaches():
+    body = request.get_json(silent=True) or {}
+    rows = body.get("assignments") if isinstance(body, dict) else None
+    if not isinstance(rows, list) or not rows:
+        raise BadRequest("assignments must be a non-empty list")
+    if not all(isinstance(r, dict) for r in rows):
+        raise BadRequest("each assignment must be an object")
+
+    # the validator takes form-style strings
+    rows = [{k: "" if v is None else str(v) for k, v in r.items()} for r in rows]
+    clean, errors = bulk.validate_teaches_rows(rows)
+    if errors:
+        return jsonify(error="nothing saved", errors=errors), 400
+
+    created = bulk.insert_teaches(clean)
+    db.session.commit()
+    return jsonify(created=created, skipped=len(rows) - created), 201
+
+
+# ---------------------------------------------------
+# BANDS
+# ---------------------------------------------------
+def band_counts(sem=None, course=None):
+    """Overall band counts plus a per-course breakdown."""
+    query = (
+        db.session.query(Marks.course_code, Marks.category, func.count())
+        .filter(Marks.category.in_(BANDS))
+        .group_by(Marks.course_code, Marks.category)
+        .order_by(Marks.course_code)
+    )
+    if sem:
+        query = query.join(Student, Student.usn == Marks.usn) \
+                     .filter(Student.sem == sem)
+    if course:
+        query = query.filter(Marks.course_code == course)
+
+    per_course = {}
+    for code, band, n in query:
+        per_course.setdefault(code, dict.fromkeys(BANDS, 0))[band] = n
+    return per_course
+
+
+@bp.route("/bands")
+@conditional(("student", "marks"))
+def bands():
+    f = filters()
+    if f["sem"] or f["course"]:
+        per_course = cache.results.get(
+            ("api_bands", f["sem"], f["course"]), ("marks", "student"),
+            lambda: band_counts(f["sem"], f["course"])
+        )
+        overall = dict.fromkeys(BANDS, 0)
+        for counts in per_course.values():
+            for band, n in counts.items():
+                overall[band] += n
+    else:
+        # unfiltered totals come from the trigger-maintained counters
+        overall = stats.get()["band_counts"]
+        per_course = cache.results.get(
+            ("api_bands", None, None), ("marks",), band_counts
+        )
+
+    return jsonify(
+        bands=overall,
+        courses=[{"course_code": code, **counts}
+                 for code, counts in per_course.items()],
+    )
+
+
+# ---------------------------------------------------
+# ANALYTICS
+# ---------------------------------------------------
+@bp.route("/analytics")
+@conditional(analytics.TABLES)
+def distributions():
+    f = filters()
+    return jsonify(analytics.get(f["sem"], f["section"], f["course"]))
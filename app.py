@@ -1,56 +1,103 @@
+import os
+
 from flask import (
-    Flask, render_template, request, redirect,
-    url_for, session, flash
+    Flask, Blueprint, current_app, render_template, request, redirect,
+    url_for, session, flash, send_file, abort, stream_template, g, jsonify
+)
+from werkzeug.utils import secure_filename
+from models import (
+    db, Student, Teacher, Course, Teaches, Marks, Supplementary, ImportRun,
+    ExportRun
 )
-from models import db, Student, Teacher, Course, Teaches, Marks, Supplementary
-from sqlalchemy import func
+from sqlalchemy import func, or_
+import config
+import stats
+import analytics
+import access
+import changelog
+import search
+import rollup
+import migrations
+import bulk
+import importer
+import export
+import jobs
+import maintenance
+import scoring
+import cache
+import instrumentation
+import sessions
+import api
+import archive
+from refdata import refdata
+from pagination import paginate, per_page_arg
 
 # ---------------------------------------------------
-# APP + DB SETUP
+# PAGES
+# every page route lives on this blueprint; create_app() at the bottom
+# builds the application around it
 # ---------------------------------------------------
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///DPMS.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = 'your-secret-key'
+bp = Blueprint("main", __name__)
+
 
-db.init_app(app)
+BANDS = ("green", "yellow", "red")
 
-with app.app_context():
-    db.create_all()
+
+def listing_filters():
+    """sem / section / course / band filters shared by the list pages."""
+    band = request.args.get("band") or None
+    return {
+        "sem": request.args.get("sem", type=int),
+        "section": request.args.get("section") or None,
+        "course": request.args.get("course") or None,
+        "band": band if band in BANDS else None,
+    }
 
 
 # ---------------------------------------------------
 # LOGIN GUARD
 # ---------------------------------------------------
-@app.before_request
+@bp.before_app_request
 def require_login():
+    # static files skip the session and identity lookups entirely
+    if request.endpoint == "static":
+        return
+
+    # resolved once per request from the in-memory teacher cache
+    g.teacher = sessions.current_teacher()
+
     # endpoints that are allowed without being logged in
-    allowed = {"login", "static"}
+    allowed = {"main.login"}
+    if current_app.config.get("METRICS_PUBLIC"):
+        allowed.add("instrumentation.prometheus")
     # if you want to allow creating first teacher without login, add:
     # allowed.update({"add_teacher_page", "add_teacher"})
-    if request.endpoint not in allowed and not session.get("teacher_name"):
+    if request.endpoint not in allowed and g.teacher is None:
+        if request.blueprint == "api":
+            return {"error": "login required"}, 401
         return redirect("/login")
 
 
 # ---------------------------------------------------
 # LOGIN
 # ---------------------------------------------------
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     if session.get("teacher_name"):
-        return redirect(url_for("index"))
+        return redirect(url_for("main.index"))
 
     if request.method == "POST":
         name = (request.form.get("teacher_name") or "").strip()
 
-        teacher = Teacher.query.filter(
-            func.lower(Teacher.teacher_name) == name.lower()
-        ).first()
+        # in-memory name map instead of a lower() scan of teacher
+        teacher = refdata.teacher_by_name(name)
 
         if not teacher:
             flash("Teacher not found", "error")
             return redirect("/login")
 
+        # fresh session id on login
+        sessions.rotate()
         session["teacher_name"] = teacher.teacher_name
         session["tid"] = teacher.tid
         return redirect("/")
@@ -58,7 +105,7 @@ def login():
     return render_template("login.html")
 
 
-@app.route("/logout")
+@bp.route("/logout")
 def logout():
     session.clear()
     return redirect("/login")
@@ -67,48 +114,68 @@ def logout():
 # ---------------------------------------------------
 # DASHBOARD
 # ---------------------------------------------------
-@app.route("/")
+@bp.route("/")
 def index():
-    total_students = Student.query.count()
-    total_teachers = Teacher.query.count()
-
-    avg_score = db.session.query(func.avg(Marks.total_score)).scalar() or 0
-    avg_score = round(avg_score, 2)
-
-    band_counts = {
-        "green": Marks.query.filter_by(category="green").count(),
-        "yellow": Marks.query.filter_by(category="yellow").count(),
-        "red": Marks.query.filter_by(category="red").count()
-    }
-
-    supp_count = Supplementary.query.count()
+    # single-row read; counters are maintained by triggers (see stats.py)
+    dash = stats.get()
+    archived = archive.requested()
+    batches = []
+    if archived:
+        # totals recorded when each semester was archived (see archive.py)
+        sem = request.args.get("sem", type=int)
+        batches = archive.summaries(sem)
+        dash = dict(archive.dashboard(sem), total_teachers=dash["total_teachers"])
 
     return render_template(
         "index.html",
         teacher_name=session.get("teacher_name"),
-        total_students=total_students,
-        total_teachers=total_teachers,
-        avg_score=avg_score,
-        supp_count=supp_count,
-        band_counts=band_counts
+        total_students=dash["total_students"],
+        total_teachers=dash["total_teachers"],
+        avg_score=dash["avg_score"],
+        supp_count=dash["supp_count"],
+        band_counts=dash["band_counts"],
+        archived=archived,
+        batches=batches
     )
 
 
 # ---------------------------------------------------
 # STUDENTS
 # ---------------------------------------------------
-@app.route("/students")
+@bp.route("/students")
 def students():
-    all_students = Student.query.all()
-    return render_template("students.html", students=all_students)
+    f = listing_filters()
+
+    query = Student.query
+    if f["sem"]:
+        query = query.filter(Student.sem == f["sem"])
+    if f["section"]:
+        query = query.filter(Student.section == f["section"])
+    if f["course"] or f["band"]:
+        has_marks = db.session.query(Marks).filter(Marks.usn == Student.usn)
+        if f["course"]:
+            has_marks = has_marks.filter(Marks.course_code == f["course"])
+        if f["band"]:
+            has_marks = has_marks.filter(Marks.category == f["band"])
+        query = query.filter(has_marks.exists())
+
+    page = paginate(
+        query, [Student.usn], lambda s: (s.usn,),
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page_arg()
+    )
+    return render_template(
+        "students.html", students=page.items, page=page, filters=f
+    )
 
 
-@app.route("/add-student-page")
+@bp.route("/add-student-page")
 def add_student_page():
     return render_template("add_student.html")
 
 
-@app.route("/add-student", methods=["POST"])
+@bp.route("/add-student", methods=["POST"])
 def add_student():
     data = request.form
 
@@ -125,7 +192,7 @@ def add_student():
     return redirect("/students")
 
 
-@app.route("/edit-student/<usn>", methods=["GET", "POST"])
+@bp.route("/edit-student/<usn>", methods=["GET", "POST"])
 def edit_student(usn):
     student = Student.query.get_or_404(usn)
 
@@ -144,21 +211,111 @@ def edit_student(usn):
     return render_template("edit_student.html", student=student)
 
 
+def deleted(counts, what):
+    """Flash a cascade's row counts and queue ANALYZE after a large one."""
+    flash(f"{what} deleted ({maintenance.summary(counts)})", "success")
+    maintenance.schedule_optimize(sum(counts.values()))
+
+
+@bp.route("/delete-student/<usn>", methods=["POST"])
+def delete_student(usn):
+    counts = maintenance.delete_students([usn])
+    if not counts["student"]:
+        abort(404)
+    db.session.commit()
+    deleted(counts, "Student")
+    return redirect("/students")
+
+
+@bp.route("/delete-students", methods=["POST"])
+def delete_students():
+    # a whole class, e.g. a graduated semester (section optional)
+    sem = request.form.get("sem", type=int)
+    section = request.form.get("section") or None
+    if not sem:
+        flash("Pick a semester to delete", "error")
+        return redirect("/students")
+
+    counts = maintenance.delete_students(sem=sem, section=section)
+    db.session.commit()
+    deleted(counts, f"Semester {sem}{' section ' + section if section else ''}")
+    return redirect("/students")
+
+
+@bp.route("/student/<usn>")
+def student_profile(usn):
+    # summary, band counts and rank come from student_rollup (see rollup.py)
+    hit = rollup.get(usn)
+    if hit is None:
+        abort(404)
+    summary, student_name = hit
+
+    courses = (
+        db.session.query(Marks, Course.course_name, Course.credit)
+        .join(Course, Course.course_code == Marks.course_code, isouter=True)
+        .filter(Marks.usn == usn)
+        .order_by(Marks.course_code)
+        .all()
+    )
+    supp_teachers = {}
+    for code, name in (
+        db.session.query(Supplementary.course_code, Teacher.teacher_name)
+        .join(Teacher, Teacher.tid == Supplementary.teacher_id, isouter=True)
+        .filter(Supplementary.usn == usn)
+    ):
+        supp_teachers.setdefault(code, []).append(name or "?")
+
+    return render_template(
+        "student.html",
+        student_name=student_name,
+        summary=summary,
+        rank=rollup.rank_of(summary),
+        courses=courses,
+        supp_teachers=supp_teachers,
+        history=changelog.history(usn, limit=30)
+    )
+
+
 # ---------------------------------------------------
 # TEACHERS
 # ---------------------------------------------------
-@app.route("/teachers")
+def teachers_query(f):
+    """Teachers with a Teaches row matching the listing filters."""
+    query = Teacher.query
+    if f["course"] or f["sem"] or f["section"]:
+        teaches = db.session.query(Teaches).filter(Teaches.tid == Teacher.tid)
+        if f["course"]:
+            teaches = teaches.filter(Teaches.course_code == f["course"])
+        if f["sem"]:
+            teaches = teaches.filter(Teaches.sem == f["sem"])
+        if f["section"]:
+            teaches = teaches.filter(Teaches.section == f["section"])
+        query = query.filter(teaches.exists())
+    return query
+
+
+@bp.route("/teachers")
 def teachers():
-    all_teachers = Teacher.query.all()
-    return render_template("teachers.html", teachers=all_teachers)
+    f = listing_filters()
+    query = teachers_query(f)
+
+    page = paginate(
+        query, [Teacher.tid], lambda t: (t.tid,),
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page_arg()
+    )
+    return render_template(
+        "teachers.html", teachers=page.items, page=page, filters=f
+    )
 
 
-@app.route("/add-teacher-page")
+@bp.route("/add-teacher-page")
 def add_teacher_page():
     return render_template("add_teacher.html")
 
 
-@app.route("/add-teacher", methods=["POST"])
+@bp.route("/add-teacher", methods=["POST"])
 def add_teacher():
     data = request.form
 
@@ -176,11 +333,12 @@ def add_teacher():
     t = Teacher(tid=tid, teacher_name=name)
     db.session.add(t)
     db.session.commit()
+    refdata.invalidate()
     flash("Teacher added", "success")
     return redirect("/teachers")
 
 
-@app.route("/edit-teacher/<tid>", methods=["GET", "POST"])
+@bp.route("/edit-teacher/<tid>", methods=["GET", "POST"])
 def edit_teacher(tid):
     teacher = Teacher.query.get_or_404(tid)
 
@@ -188,40 +346,57 @@ def edit_teacher(tid):
         data = request.form
         teacher.teacher_name = data.get("name", teacher.teacher_name)
         db.session.commit()
+        refdata.invalidate()
         flash("Teacher updated", "success")
         return redirect("/teachers")
 
     return render_template("edit_teacher.html", teacher=teacher)
 
 
-@app.route("/delete-teacher/<tid>", methods=["POST"])
+@bp.route("/delete-teacher/<tid>", methods=["POST"])
 def delete_teacher(tid):
-    teacher = Teacher.query.get_or_404(tid)
-
-    # remove teaches mappings first
-    Teaches.query.filter_by(tid=tid).delete()
-    # supplementary has FK with ON DELETE CASCADE (if defined in schema)
-    db.session.delete(teacher)
+    # Teaches rows and their supplementaries go with the teacher
+    counts = maintenance.delete_teachers([tid])
+    if not counts["teacher"]:
+        abort(404)
     db.session.commit()
-    flash("Teacher deleted", "success")
+    refdata.invalidate()
+    deleted(counts, "Teacher")
     return redirect("/teachers")
 
 
 # ---------------------------------------------------
 # COURSES  (ONLY Course table)
 # ---------------------------------------------------
-@app.route("/courses")
+@bp.route("/courses")
 def courses():
-    all_courses = Course.query.all()
-    return render_template("courses.html", courses=all_courses)
+    f = listing_filters()
+
+    query = Course.query
+    if f["sem"]:
+        query = query.filter(Course.sem == f["sem"])
+    if f["course"]:
+        query = query.filter(
+            Course.course_code.startswith(f["course"], autoescape=True)
+        )
+
+    page = paginate(
+        query, [Course.course_code], lambda c: (c.course_code,),
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page_arg()
+    )
+    return render_template(
+        "courses.html", courses=page.items, page=page, filters=f
+    )
 
 
-@app.route("/add-course-page")
+@bp.route("/add-course-page")
 def add_course_page():
     return render_template("add_course.html")
 
 
-@app.route("/add-course", methods=["POST"])
+@bp.route("/add-course", methods=["POST"])
 def add_course():
     data = request.form
     course_name = (data.get("course_name") or "").strip()
@@ -246,6 +421,7 @@ def add_course():
         c = Course(course_code=course_code, credit=credit,course_name=course_name,sem=int(sem_raw or 0))
         db.session.add(c)
         db.session.commit()
+        refdata.invalidate()
     except ValueError:
         flash("Semester must be a number", "error")
         return redirect("/add-course-page")
@@ -254,7 +430,7 @@ def add_course():
     return redirect("/courses")
 
 
-@app.route("/edit-course/<course_code>", methods=["GET", "POST"])
+@bp.route("/edit-course/<course_code>", methods=["GET", "POST"])
 def edit_course(course_code):
     course = Course.query.get_or_404(course_code)
 
@@ -266,75 +442,119 @@ def edit_course(course_code):
             course.credit = int(data.get("credit") or course.credit or 0)
         except ValueError:
             flash("Credit must be a number", "error")
-            return redirect(url_for("edit_course", course_code=course_code))
+            return redirect(url_for("main.edit_course", course_code=course_code))
 
         db.session.commit()
+        refdata.invalidate()
         flash("Course updated successfully", "success")
         return redirect("/courses")
 
     return render_template("edit_course.html", course=course)
 
 
+@bp.route("/delete-course/<course_code>", methods=["POST"])
+def delete_course(course_code):
+    # marks, supplementaries and Teaches rows of the course go with it
+    counts = maintenance.delete_courses([course_code])
+    if not counts["course"]:
+        abort(404)
+    db.session.commit()
+    refdata.invalidate()
+    deleted(counts, "Course")
+    return redirect("/courses")
+
+
 # ---------------------------------------------------
 # TEACHES (Teacher ↔ Course mapping)
 # ---------------------------------------------------
-@app.route("/assign-course-page")
+@bp.route("/assign-course-page")
 def assign_course_page():
-    teachers = Teacher.query.all()
-    courses = Course.query.all()
+    sem = request.args.get("sem", type=int)
+    teachers = refdata.teachers()
+    # courses of the semester, plus those with no semester recorded
+    courses = [c for c in refdata.courses() if sem and c.sem in (sem, None)]
+
+    # cells already taken show the current section instead of a picker
+    assigned = {}
+    if sem:
+        rows = db.session.query(
+            Teaches.tid, Teaches.course_code, Teaches.sem, Teaches.section
+        ).filter(or_(Teaches.sem == sem, Teaches.sem.is_(None)))
+        for tid, code, t_sem, section in rows:
+            assigned[(str(tid), code)] = (
+                f"Sem {t_sem or '-'} · {section or 'All'}"
+            )
+
     return render_template(
         "assign_course.html",
         teachers=teachers,
-        courses=courses
+        courses=courses,
+        assigned=assigned,
+        sections=bulk.SECTIONS,
+        sem=sem
     )
 
 
-@app.route("/assign-course", methods=["POST"])
+@bp.route("/assign-course", methods=["POST"])
 def assign_course():
     data = request.form
-    tid = data.get("tid")
-    course_code = data.get("course_code")
-
-    if not tid or not course_code:
-        flash("Teacher and course are required", "error")
-        return redirect("/assign-course-page")
-
-    # ensure teacher and course exist
-    if not Teacher.query.get(tid):
-        flash("Selected teacher does not exist", "error")
-        return redirect("/assign-course-page")
-
-    if not Course.query.get(course_code):
-        flash("Selected course does not exist", "error")
-        return redirect("/assign-course-page")
-
-    # avoid duplicate mapping
-    if Teaches.query.filter_by(tid=tid, course_code=course_code).first():
-        flash("This teacher is already assigned to that course", "error")
-        return redirect("/assign-course-page")
-
-    tmap = Teaches(tid=tid, course_code=course_code)
-    db.session.add(tmap)
+    sem = data.get("sem")
+    back = url_for("main.assign_course_page", sem=sem)
+
+    # one row per matrix cell with a section picked ("all": every section)
+    rows = [
+        {"tid": tid, "course_code": code, "sem": sem,
+         "section": "" if section == "all" else section}
+        for tid, code, section in zip(
+            data.getlist("tid[]"),
+            data.getlist("course_code[]"),
+            data.getlist("section[]")
+        )
+        if section
+    ]
+    if not rows:
+        flash("Pick a section in at least one cell", "error")
+        return redirect(back)
+
+    clean, errors = bulk.validate_teaches_rows(rows)
+    if errors:
+        for err in errors:
+            flash(err, "error")
+        flash("Nothing saved; fix the assignments above and resubmit.", "error")
+        return redirect(back)
+
+    written = bulk.insert_teaches(clean)
     db.session.commit()
-    flash("Course assigned to teacher", "success")
-    return redirect("/assign-course-page")
+    flash(f"Saved {written} course assignment(s)", "success")
+    return redirect(back)
 
 
 # ---------------------------------------------------
 # MARKS
 # ---------------------------------------------------
-@app.route("/add-marks-page")
+@bp.route("/add-marks-page")
 def add_marks_page():
-    students = Student.query.all()
-    courses = Course.query.all()
+    scope = access.scoped()
+    if scope:
+        # only the classes / courses this teacher has in Teaches
+        mine = access.current()
+        students = (
+            Student.query.filter(access.students_filter(mine))
+            .order_by(Student.usn).all()
+        )
+        courses = [c for c in refdata.courses() if c.course_code in mine.courses]
+    else:
+        students = Student.query.all()
+        courses = refdata.courses()
     return render_template(
         "add_marks.html",
         students=students,
-        courses=courses
+        courses=courses,
+        scope=scope
     )
 
 
-@app.route("/add-marks", methods=["POST"])
+@bp.route("/add-marks", methods=["POST"])
 def add_marks():
     data = request.form
     usn = data.get("usn")
@@ -364,16 +584,18 @@ def add_marks():
         ia1=int(data.get("ia1") or 0),
         ia2=int(data.get("ia2") or 0),
         ia3=int(data.get("ia3") or 0),
-        assignment=int(data.get("assignment") or 0)
+        assignment=int(data.get("assignment") or 0),
+        updated_by=str(g.teacher.tid)
     )
+    scoring.apply(m)
 
     db.session.add(m)
-    db.session.commit()  # DB trigger calc_category will set total_score & category
+    db.session.commit()
     flash("Marks added", "success")
     return redirect("/monitor")
 
 
-@app.route("/edit-marks/<usn>/<course_code>", methods=["GET", "POST"])
+@bp.route("/edit-marks/<usn>/<course_code>", methods=["GET", "POST"])
 def edit_marks(usn, course_code):
     marks = Marks.query.filter_by(usn=usn, course_code=course_code).first_or_404()
 
@@ -383,16 +605,9 @@ def edit_marks(usn, course_code):
         marks.ia2 = int(data.get("ia2") or marks.ia2 or 0)
         marks.ia3 = int(data.get("ia3") or marks.ia3 or 0)
         marks.assignment = int(data.get("assignment") or marks.assignment or 0)
+        marks.updated_by = str(g.teacher.tid)
 
-        # recompute score + category to match trigger logic
-        total = ((marks.ia1 + marks.ia2 + marks.ia3) / 3) + marks.assignment
-        marks.total_score = total
-        if total < 20:
-            marks.category = "red"
-        elif total < 40:
-            marks.category = "yellow"
-        else:
-            marks.category = "green"
+        scoring.apply(marks)
 
         db.session.commit()
         flash("Marks updated", "success")
@@ -400,14 +615,99 @@ def edit_marks(usn, course_code):
 
     return render_template(
         "edit_marks.html",
-        marks=marks
+        marks=marks,
+        history=changelog.history(usn, course_code)
+    )
+
+
+def marks_bulk_query(sem, section, course):
+    """Whole section x course grid in one outer join."""
+    return (
+        db.session.query(
+            Student.student_name,
+            Student.usn,
+            Marks.ia1,
+            Marks.ia2,
+            Marks.ia3,
+            Marks.assignment
+        )
+        .outerjoin(
+            Marks,
+            (Marks.usn == Student.usn) & (Marks.course_code == course)
+        )
+        .filter(Student.sem == sem, Student.section == section)
+        .order_by(Student.usn)
+    )
+
+
+@bp.route("/marks-bulk", methods=["GET"])
+def marks_bulk_page():
+    sem = request.args.get("sem", type=int)
+    section = request.args.get("section")
+    course = request.args.get("course")
+    scope = access.scoped()
+
+    courses = refdata.courses()
+    if scope:
+        mine = access.current()
+        courses = [c for c in courses if c.course_code in mine.courses]
+        if course and section and not access.allows(mine, course, section):
+            flash(f"You do not teach {course} to section {section}", "error")
+            course = None
+
+    rows = []
+    if sem and section and course:
+        rows = marks_bulk_query(sem, section, course).all()
+
+    return render_template(
+        "marks_bulk_entry.html",
+        courses=courses,
+        students=rows,
+        sem=sem,
+        section=section,
+        course=course,
+        scope=scope
     )
 
 
+@bp.route("/marks-bulk", methods=["POST"])
+def marks_bulk_save():
+    data = request.form
+    course_code = (data.get("course") or "").strip()
+    back = url_for(
+        "main.marks_bulk_page",
+        sem=data.get("sem"), section=data.get("section"), course=course_code,
+        scope=data.get("scope") or None
+    )
+
+    rows = [
+        {"usn": usn, "ia1": ia1, "ia2": ia2, "ia3": ia3, "assignment": asg}
+        for usn, ia1, ia2, ia3, asg in zip(
+            data.getlist("usn[]"),
+            data.getlist("ia1[]"),
+            data.getlist("ia2[]"),
+            data.getlist("ia3[]"),
+            data.getlist("assignment[]")
+        )
+    ]
+
+    clean, errors = bulk.validate_marks_rows(course_code, rows)
+    if errors:
+        for err in errors:
+            flash(err, "error")
+        flash("Nothing saved; fix the rows above and resubmit.", "error")
+        return redirect(back)
+
+    written = bulk.upsert_marks(clean, updated_by=str(g.teacher.tid))
+    db.session.commit()
+    flash(f"Saved marks for {written} student(s)", "success")
+    return redirect(back)
+
+
 # ---------------------------------------------------
 # SUPPLEMENTARY
 # ---------------------------------------------------
-@app.route("/supplementary")
+@bp.route("/supplementary")
 def supplementary():
     records = (
         db.session.query(
@@ -424,14 +724,11 @@ def supplementary():
 
     return render_template("supplementary.html", records=records)
 
-from sqlalchemy import and_
 
-# ...
-
-@app.route("/add-supplementary-page")
+@bp.route("/add-supplementary-page")
 def add_supplementary_page():
-    teachers = Teacher.query.all()
-    courses = Course.query.all()
+    teachers = refdata.teachers()
+    courses = refdata.courses()
     return render_template(
         "add_supplementary.html",
         teachers=teachers,
@@ -439,13 +736,22 @@ def add_supplementary_page():
     )
 
 
-@app.route("/add-supplementary", methods=["POST"])
+@bp.route("/add-supplementary", methods=["POST"])
 def add_supplementary():
     teacher_id = (request.form.get("teacher_id") or "").strip()
-    course_code = (request.form.get("course_code") or "").strip()
+    course_codes = [
+        c.strip() for c in request.form.getlist("course_code") if c.strip()
+    ]
+    sem_raw = (request.form.get("sem") or "").strip()
 
-    if not teacher_id or not course_code:
-        flash("Teacher and course are required", "error")
+    if not teacher_id or not (course_codes or sem_raw):
+        flash("Teacher and a course or semester are required", "error")
+        return redirect("/add-supplementary-page")
+
+    try:
+        sem = int(sem_raw) if sem_raw else None
+    except ValueError:
+        flash("Semester must be a number", "error")
         return redirect("/add-supplementary-page")
 
     teacher = Teacher.query.get(teacher_id)
@@ -453,48 +759,26 @@ def add_supplementary():
         flash("Teacher not found", "error")
         return redirect("/add-supplementary-page")
 
-    course = Course.query.get(course_code)
-    if not course:
-        flash("Course not found", "error")
-        return redirect("/add-supplementary-page")
-
-    # Find all red-band students for that course
-    red_rows = (
-        db.session.query(Marks.usn)
-        .filter(
-            and_(
-                Marks.course_code == course_code,
-                Marks.category == "red"
-            )
-        )
-        .all()
+    if course_codes:
+        found = {
+            code for (code,) in db.session.query(Course.course_code)
+            .filter(Course.course_code.in_(course_codes))
+        }
+        missing = sorted(set(course_codes) - found)
+        if missing:
+            flash(f"Course not found: {', '.join(missing)}", "error")
+            return redirect("/add-supplementary-page")
+
+    # one INSERT ... SELECT for every red-band row in scope, off the
+    # request thread
+    job = jobs.submit(
+        "assign_supplementary",
+        teacher_id=teacher_id, course_codes=course_codes, sem=sem
     )
+    flash(f"Assigning supplementary teacher (job #{job.id})", "info")
+    return redirect(url_for("jobs.job_status", job_id=job.id))
 
-    if not red_rows:
-        flash("No red-band students found for this course", "info")
-        return redirect("/add-supplementary-page")
-
-    created = 0
-    for (usn,) in red_rows:
-        exists = Supplementary.query.filter_by(
-            usn=usn,
-            course_code=course_code,
-            teacher_id=teacher_id
-        ).first()
-        if not exists:
-            db.session.add(
-                Supplementary(
-                    usn=usn,
-                    course_code=course_code,
-                    teacher_id=teacher_id
-                )
-            )
-            created += 1
-
-    db.session.commit()
-    flash(f"Supplementary assigned for {created} student(s).", "success")
-    return redirect("/supplementary")
-@app.route("/delete-supplementary/<usn>/<course_code>", methods=["POST"])
+@bp.route("/delete-supplementary/<usn>/<course_code>", methods=["POST"])
 def delete_supplementary(usn, course_code):
     # delete all supplementary records for that student & course
     Supplementary.query.filter_by(usn=usn, course_code=course_code).delete()
@@ -502,7 +786,7 @@ def delete_supplementary(usn, course_code):
     flash("Supplementary record deleted", "success")
     return redirect("/supplementary")
 
-@app.route("/edit-supplementary/<usn>/<course_code>", methods=["GET", "POST"])
+@bp.route("/edit-supplementary/<usn>/<course_code>", methods=["GET", "POST"])
 def edit_supplementary(usn, course_code):
     supp = Supplementary.query.filter_by(usn=usn, course_code=course_code).first()
 
@@ -525,7 +809,7 @@ def edit_supplementary(usn, course_code):
         flash("Supplementary updated", "success")
         return redirect("/supplementary")
 
-    teachers = Teacher.query.all()
+    teachers = refdata.teachers()
     return render_template(
         "edit_supplementary.html",
         supp=supp,
@@ -533,10 +817,146 @@ def edit_supplementary(usn, course_code):
     )
 
 
+# ---------------------------------------------------
+# IMPORT (CSV / XLSX)
+# ---------------------------------------------------
+@bp.route("/import", methods=["GET", "POST"])
+def import_data():
+    if request.method == "POST":
+        kind = request.form.get("kind")
+        upload = request.files.get("file")
+
+        if kind not in importer.KINDS:
+            flash("Pick what you are importing", "error")
+            return redirect("/import")
+        if not upload or not upload.filename:
+            flash("Choose a CSV or XLSX file", "error")
+            return redirect("/import")
+
+        filename = secure_filename(upload.filename)
+        if not filename.lower().endswith((".csv", ".xlsx")):
+            flash("Only .csv and .xlsx files are supported", "error")
+            return redirect("/import")
+
+        # keep the upload on disk so an interrupted load can be resumed
+        folder = os.path.join(current_app.instance_path, "imports")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{kind}-{filename}")
+        upload.save(path)
+
+        job = jobs.submit("import", kind=kind, path=path)
+        flash(f"Importing {filename} (job #{job.id})", "info")
+        return redirect(url_for("jobs.job_status", job_id=job.id))
+
+    runs = ImportRun.query.order_by(ImportRun.id.desc()).limit(20).all()
+    return render_template("import.html", runs=runs)
+
+
+@bp.route("/import/<int:run_id>/rejects")
+def import_rejects(run_id):
+    run = ImportRun.query.get_or_404(run_id)
+    if not run.reject_path or not os.path.exists(run.reject_path):
+        abort(404)
+    return send_file(run.reject_path, as_attachment=True)
+
+
+# ---------------------------------------------------
+# EXPORT (marks sheets)
+# ---------------------------------------------------
+@bp.route("/exports", methods=["GET", "POST"])
+def exports():
+    if request.method == "POST":
+        fmt = request.form.get("format", "csv")
+        if fmt not in export.FORMATS:
+            flash("Pick CSV or XLSX", "error")
+            return redirect("/exports")
+        if fmt == "xlsx" and not export.xlsx_available():
+            flash("XLSX export needs openpyxl installed on the server", "error")
+            return redirect("/exports")
+
+        run = ExportRun(
+            fmt=fmt,
+            sem=request.form.get("sem", type=int),
+            section=request.form.get("section") or None,
+            course_code=request.form.get("course") or None,
+            status="queued", rows=0
+        )
+        db.session.add(run)
+        db.session.commit()
+        jobs.submit("export", run_id=run.id)
+        flash(f"Export #{run.id} started; it will appear below when ready.",
+              "info")
+        return redirect("/exports")
+
+    runs = ExportRun.query.order_by(ExportRun.id.desc()).limit(20).all()
+    return render_template(
+        "exports.html", runs=runs, courses=refdata.courses(),
+        xlsx=export.xlsx_available()
+    )
+
+
+@bp.route("/exports/<int:run_id>/download")
+def export_download(run_id):
+    run = ExportRun.query.get_or_404(run_id)
+    if run.status != "done" or not run.path or not os.path.exists(run.path):
+        abort(404)
+    return send_file(run.path, as_attachment=True)
+
+
+@bp.route("/marks-sheet")
+def marks_sheet():
+    """Printable marks sheet (print to PDF from the browser), streamed."""
+    sem = request.args.get("sem", type=int)
+    section = request.args.get("section") or None
+    course = request.args.get("course") or None
+    if not (sem or section or course):
+        flash("Pick a semester, section or course for the marks sheet", "error")
+        return redirect("/exports")
+
+    return stream_template(
+        "marks_sheet.html",
+        header=export.HEADER,
+        rows=export.sheet_rows(sem, section, course),
+        sem=sem, section=section, course=course
+    )
+
+
+# ---------------------------------------------------
+# SEARCH
+# ---------------------------------------------------
+def search_url(result):
+    key = result["key"]
+    if result["kind"] == "student":
+        return url_for("main.student_profile", usn=key)
+    if result["kind"] == "teacher":
+        return url_for("main.edit_teacher", tid=key)
+    return url_for("main.edit_course", course_code=key)
+
+
+@bp.route("/search")
+def search_page():
+    q = request.args.get("q", "")
+    kinds = request.args.getlist("kind")
+    limit = request.args.get("limit", 20, type=int)
+
+    results, fuzzy = search.search(q, kinds, limit)
+    for r in results:
+        r["url"] = search_url(r)
+
+    # typeahead: /search?q=...&format=json
+    if (request.args.get("format") == "json"
+            or request.accept_mimetypes.best == "application/json"):
+        return jsonify(q=q, fuzzy=fuzzy, results=results)
+
+    return render_template(
+        "search.html", q=q, kinds=kinds, results=results, fuzzy=fuzzy
+    )
+
+
 # ---------------------------------------------------
 # MONITOR
 # ---------------------------------------------------
-@app.route("/monitor")
+@bp.route("/monitor")
 def monitor():
     filter_usn = request.args.get("usn")
 
@@ -547,7 +967,8 @@ def monitor():
             Marks.course_code,
             Marks.total_score,
             Marks.category,
-            Teacher.teacher_name.label("supp_teacher_name")
+            Teacher.teacher_name.label("supp_teacher_name"),
+            Supplementary.teacher_id.label("supp_teacher_id")
         )
         .join(Marks, Student.usn == Marks.usn, isouter=True)
         .join(
@@ -559,35 +980,208 @@ def monitor():
         .join(Teacher, Teacher.tid == Supplementary.teacher_id, isouter=True)
     )
 
+    f = listing_filters()
+
     if filter_usn:
         query = query.filter(Student.usn == filter_usn)
+    if f["sem"]:
+        query = query.filter(Student.sem == f["sem"])
+    if f["section"]:
+        query = query.filter(Student.section == f["section"])
+    if f["course"]:
+        query = query.filter(Marks.course_code == f["course"])
+    if f["band"]:
+        query = query.filter(Marks.category == f["band"])
+    if access.scoped():
+        # the teacher's own courses / sections only
+        query = query.filter(access.marks_filter(access.current()))
+    archived = archive.requested()
+    if archived:
+        # same query against the attached archive tables
+        query = archive.translate(query)
+
+    # outer-joined columns may be NULL; '' keeps the seek key total
+    course_key = func.coalesce(Marks.course_code, "")
+    supp_key = func.coalesce(Supplementary.teacher_id, "")
+    page = paginate(
+        query, [Student.usn, course_key, supp_key],
+        lambda r: (r.usn, r.course_code or "", r.supp_teacher_id or ""),
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page_arg()
+    )
+
+    return render_template(
+        "monitor.html", rows=page.items, page=page, filters=f, archived=archived
+    )
 
-    rows = query.all()
 
-    return render_template("monitor.html", rows=rows)
+# ---------------------------------------------------
+# SCORES
+# ---------------------------------------------------
+@bp.route("/recompute-scores", methods=["POST"])
+def recompute_scores():
+    job = jobs.submit("recompute_scores")
+    flash(f"Re-scoring all marks (job #{job.id})", "info")
+    return redirect(url_for("jobs.job_status", job_id=job.id))
 
 
 # ---------------------------------------------------
 # BAND ANALYSIS
 # ---------------------------------------------------
-@app.route("/band-analysis")
+@bp.route("/band-analysis")
 def band_analysis():
-    green = Marks.query.filter_by(category="green").count()
-    yellow = Marks.query.filter_by(category="yellow").count()
-    red = Marks.query.filter_by(category="red").count()
+    f = listing_filters()
+    archived = archive.requested()
+    # distributions per course / section / teacher, memoized on table versions
+    dist = analytics.get(f["sem"], f["section"], f["course"], archived)
+
+    if f["sem"] or f["section"] or f["course"] or archived:
+        bands = dist["overall"].get("bands") or dict.fromkeys(BANDS, 0)
+    else:
+        bands = stats.get()["band_counts"]
 
     labels = ["Green", "Yellow", "Red"]
-    data = [green, yellow, red]
+    data = [bands["green"], bands["yellow"], bands["red"]]
 
     return render_template(
         "band_analysis.html",
         labels=labels,
-        data=data
+        data=data,
+        dist=dist,
+        filters=f,
+        archived=archived
     )
 
 
+# ---------------------------------------------------
+# RED BAND REPORT
+# ---------------------------------------------------
+def red_band_query(sem=None, course=None):
+    """Red-band marks with their per-course count, not yet run."""
+    query = (
+        db.session.query(
+            Marks.course_code,
+            Student.student_name,
+            Marks.usn,
+            Marks.total_score,
+            func.count().over(partition_by=Marks.course_code).label("red_count")
+        )
+        .join(Student, Student.usn == Marks.usn)
+        .filter(Marks.category == "red")
+    )
+    if sem:
+        query = query.filter(Student.sem == sem)
+    if course:
+        query = query.filter(Marks.course_code == course)
+    return query.order_by(Marks.course_code, Marks.total_score, Marks.usn)
+
+
+def red_band_rows(sem=None, course=None):
+    """Red-band details plus per-course counts in one windowed query."""
+    details, summary = [], []
+    for row in red_band_query(sem, course):
+        if not summary or summary[-1]["course_code"] != row.course_code:
+            summary.append(
+                {"course_code": row.course_code, "red_count": row.red_count}
+            )
+        details.append({
+            "course_code": row.course_code,
+            "student_name": row.student_name,
+            "usn": row.usn,
+            "total_score": row.total_score,
+        })
+    return summary, details
+
+
+@bp.route("/red-report")
+def red_report():
+    sem = request.args.get("sem", type=int)
+    course = request.args.get("course") or None
+
+    # recomputed only after marks / student rows change
+    summary, details = cache.results.get(
+        ("red_report", sem, course),
+        ("marks", "student"),
+        lambda: red_band_rows(sem, course)
+    )
+
+    return render_template(
+        "red_report.html",
+        teacher_name=session.get("teacher_name"),
+        summary=summary,
+        details=details,
+        sem=sem,
+        course=course
+    )
+
+
+# ---------------------------------------------------
+# APP FACTORY
+# ---------------------------------------------------
+CLI_COMMANDS = (
+    migrations.db_cli,
+    stats.stats_cli,
+    importer.import_command,
+    export.export_command,
+    scoring.scores_cli,
+    search.search_cli,
+    rollup.rollup_cli,
+    archive.archive_cli,
+    maintenance.maint_cli,
+)
+
+
+def create_app(migrate=None):
+    """
+    Build the application.
+
+    With ``migrate`` (default: DPMS_AUTO_MIGRATE, on) the schema is created
+    and pending migrations applied first, which is what a development
+    server wants. wsgi.py passes False so production workers start without
+    any schema work; run ``flask --app app db upgrade`` once per deploy.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SECRET_KEY'] = 'your-secret-key'
+
+    # database URL, pool sizing and SQLite pragmas (see config.py)
+    config.init_app(app, db)
+    # per-endpoint SQL / render timings at /admin/metrics and /metrics
+    instrumentation.init_app(app, db)
+
+    if migrate is None:
+        migrate = os.environ.get("DPMS_AUTO_MIGRATE", "1") != "0"
+    with app.app_context():
+        if migrate:
+            migrations.setup()
+        else:
+            migrations.require_current()
+
+    # closed semesters, attached read-only to every connection (see archive.py)
+    archive.init_app(app)
+
+    # cached reports shared between worker processes (see cache.py)
+    cache.init_app(app)
+
+    # server-side sessions: the cookie only carries an id (see sessions.py)
+    sessions.init_app(app, db)
+
+    # thread pool for long operations; resumes jobs queued before a restart
+    jobs.init_app(app)
+
+    app.register_blueprint(bp)
+    # JSON API for scripts and the department portal (see api.py)
+    app.register_blueprint(api.bp)
+
+    for command in CLI_COMMANDS:
+        app.cli.add_command(command)
+    return app
+
+
 # ---------------------------------------------------
 # START SERVER
+# development only; see wsgi.py for production
 # ---------------------------------------------------
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
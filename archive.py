@@ -0,0 +1,358 @@
+"""
+Archive of closed semesters.
+
+Archiving a semester moves its students, their marks and supplementaries
+out of the live tables into ``instance/archive.db``, together with a
+snapshot of the courses, teachers and Teaches rows they refer to and a
+precomputed summary (counts, bands, the band analysis distributions). The
+live tables keep only current cohorts, so every live query and trigger
+works on less data.
+
+The archive file has the same tables as the live database (their DDL is
+copied from it) and is attached to every connection read-only as
+``archive``. A query built from the usual
+models runs against it unchanged with ``translate(query)`` (SQLAlchemy's
+schema_translate_map), which is how ``/``, ``/monitor`` and
+``/band-analysis`` serve ``?archive=1``.
+
+Archiving runs on its own connection in two steps: copy into the archive
+and record the summary, then delete from the live tables. If it stops in
+between, the rows are still live and running it again with the same label
+updates the copies and the summary. Students added to a semester after it
+was archived go in under a new label.
+
+    flask archive semester 8 --label 2025-even
+    flask archive list
+
+SQLite only; on other backends the archive is disabled.
+
+    DPMS_ARCHIVE_PATH   archive file (default: archive.db under instance/)
+"""
+import json
+import os
+import re
+from datetime import date, datetime
+
+import click
+from flask import current_app, request
+from sqlalchemy import (
+    Column, Float, Integer, MetaData, String, Table, Text,
+    create_engine, event, select, text
+)
+from sqlalchemy.pool import NullPool
+
+from models import db, Student, Teacher, Course, Teaches, Marks, Supplementary
+import config
+
+SCHEMA = "archive"
+TRANSLATE = {"schema_translate_map": {None: SCHEMA}}
+# table_version row bumped by every archive run; cached archive reports
+# are keyed on it
+TABLES = ("archive",)
+
+# moved out of the live tables / copied as a snapshot
+MOVED = (Student, Marks, Supplementary)
+SNAPSHOT = (Course, Teacher, Teaches)
+COHORT = "SELECT usn FROM main.student WHERE sem = :sem"
+
+meta = MetaData()
+batches = Table(
+    "archive_batch", meta,
+    Column("sem", Integer, primary_key=True),
+    Column("label", String, primary_key=True),
+    Column("archived_at", String, nullable=False),
+    Column("students", Integer, nullable=False),
+    Column("marks_count", Integer, nullable=False),
+    Column("scored_count", Integer, nullable=False),
+    Column("score_sum", Float, nullable=False),
+    Column("green", Integer, nullable=False),
+    Column("yellow", Integer, nullable=False),
+    Column("red", Integer, nullable=False),
+    Column("supp_count", Integer, nullable=False),
+    Column("analytics", Text, nullable=False),
+)
+
+
+def path(app=None):
+    app = app or current_app
+    name = os.environ.get("DPMS_ARCHIVE_PATH") or "archive.db"
+    return os.path.join(app.instance_path, name)
+
+
+def enabled(app=None):
+    app = app or current_app
+    return config.backend(app.config["SQLALCHEMY_DATABASE_URI"]) == "sqlite"
+
+
+def create_tables(conn):
+    """
+    Create missing archive tables and their indexes from the live
+    database's own DDL (which is looser than the models in places), plus
+    archive_batch. ``conn`` has the archive attached read-write.
+    """
+    have = {name for (name,) in conn.execute(text(
+        f"SELECT name FROM {SCHEMA}.sqlite_master"
+    ))}
+    for model in MOVED + SNAPSHOT:
+        ddl = conn.execute(text(
+            "SELECT type, name, sql FROM main.sqlite_master "
+            "WHERE tbl_name = :t AND type IN ('table', 'index') "
+            "AND sql IS NOT NULL ORDER BY type = 'index'"
+        ), {"t": model.__tablename__})
+        for kind, name, sql in ddl:
+            if name in have:
+                continue
+            # CREATE TABLE x / CREATE INDEX ix ON x -> archive.x / archive.ix
+            conn.execute(text(re.sub(
+                rf"^(CREATE (?:UNIQUE )?{kind.upper()}) ",
+                rf"\1 {SCHEMA}.", sql, count=1, flags=re.IGNORECASE,
+            )))
+    meta.create_all(conn.execution_options(**TRANSLATE))
+
+
+def _attach(file_path, readonly):
+    mode = "ro" if readonly else "rwc"
+
+    def attach(dbapi_connection, connection_record=None):
+        dbapi_connection.execute(
+            f"ATTACH DATABASE 'file:{file_path}?mode={mode}' AS {SCHEMA}"
+        )
+    return attach
+
+
+def _no_foreign_keys(dbapi_connection, connection_record=None):
+    # the archive copies rows as they are, including marks for courses
+    # missing from the catalogue; the live side deletes children first
+    dbapi_connection.execute("PRAGMA foreign_keys = OFF")
+
+
+def _writer(file_path):
+    """Engine of one-off connections with the archive attached read-write."""
+    engine = create_engine(db.engine.url, poolclass=NullPool,
+                           connect_args={"timeout": config.busy_timeout_ms() / 1000})
+    event.listen(engine, "connect", config.set_sqlite_pragmas)
+    event.listen(engine, "connect", _no_foreign_keys)
+    event.listen(engine, "connect", _attach(file_path, readonly=False))
+    return engine
+
+
+def init_app(app):
+    """Create the archive file if needed and attach it to every connection."""
+    if not enabled(app):
+        return
+    file_path = path(app)
+    os.makedirs(app.instance_path, exist_ok=True)
+    with app.app_context():
+        engine = _writer(file_path)
+        try:
+            with engine.begin() as conn:
+                create_tables(conn)
+        finally:
+            engine.dispose()
+        event.listen(db.engine, "connect", _attach(file_path, readonly=True))
+        # connections opened before the listener (migrations) lack the attach
+        db.engine.dispose()
+
+
+# ---------------------------------------------------
+# READ
+# ---------------------------------------------------
+def requested():
+    """True when the page was asked for archived data (``?archive=1``)."""
+    return request.args.get("archive") in ("1", "true", "yes", "on")
+
+
+def translate(query):
+    """Run ``query`` (ORM query or select) against the archive tables."""
+    return query.execution_options(**TRANSLATE)
+
+
+def summaries(sem=None):
+    stmt = select(batches).order_by(batches.c.sem, batches.c.label)
+    if sem:
+        stmt = stmt.where(batches.c.sem == sem)
+    return db.session.execute(translate(stmt)).mappings().all()
+
+
+def stored_analytics(sem):
+    """
+    The band analysis recorded when ``sem`` was archived, or None when it
+    was archived in more than one batch (their distributions cannot be
+    merged) or not at all.
+    """
+    rows = summaries(sem) if sem else []
+    if len(rows) != 1:
+        return None
+    return json.loads(rows[0]["analytics"])
+
+
+def dashboard(sem=None):
+    """stats.get()-shaped totals over the archived batches."""
+    rows = summaries(sem)
+    total = {f: sum(r[f] for r in rows) for f in (
+        "students", "scored_count", "score_sum", "green", "yellow", "red",
+        "supp_count",
+    )}
+    avg = total["score_sum"] / total["scored_count"] if total["scored_count"] else 0
+    return {
+        "total_students": total["students"],
+        "avg_score": round(avg, 2),
+        "supp_count": total["supp_count"],
+        "band_counts": {b: total[b] for b in ("green", "yellow", "red")},
+    }
+
+
+# ---------------------------------------------------
+# WRITE
+# ---------------------------------------------------
+def _copy(conn, model, where, sem):
+    """
+    Upsert the live rows matching ``where`` into the archive. An upsert
+    rather than INSERT OR REPLACE: replacing a course or student row would
+    fire the archive's ON DELETE CASCADE on rows archived earlier.
+    """
+    table = model.__table__
+    cols = ", ".join(c.name for c in table.columns)
+    keys = [c.name for c in table.primary_key]
+    rest = [c.name for c in table.columns if c.name not in keys]
+    action = ("DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in rest)
+              if rest else "DO NOTHING")
+    conn.execute(text(
+        f"INSERT INTO {SCHEMA}.{table.name} ({cols}) "
+        f"SELECT {cols} FROM main.{table.name} {where} "
+        f"ON CONFLICT ({', '.join(keys)}) {action}"
+    ), {"sem": sem})
+
+
+def _summary(conn, sem):
+    import analytics   # analytics imports this module
+
+    counts = conn.execute(text(f"""
+        SELECT COUNT(*), COUNT(total_score), COALESCE(SUM(total_score), 0),
+               COALESCE(SUM(category IS 'green'), 0),
+               COALESCE(SUM(category IS 'yellow'), 0),
+               COALESCE(SUM(category IS 'red'), 0)
+        FROM main.marks WHERE usn IN ({COHORT})
+    """), {"sem": sem}).one()
+    students = conn.execute(
+        text("SELECT COUNT(*) FROM main.student WHERE sem = :sem"), {"sem": sem}
+    ).scalar()
+    supp = conn.execute(text(
+        f"SELECT COUNT(*) FROM main.supplementary WHERE usn IN ({COHORT})"
+    ), {"sem": sem}).scalar()
+    return {
+        "students": students,
+        "marks_count": counts[0],
+        "scored_count": counts[1],
+        "score_sum": float(counts[2]),
+        "green": counts[3],
+        "yellow": counts[4],
+        "red": counts[5],
+        "supp_count": supp,
+        # the app session still reads the live rows at this point
+        "analytics": json.dumps(analytics.compute(sem)),
+    }
+
+
+def archive_semester(sem, label=None):
+    """
+    Move semester ``sem`` into the archive. Returns the summary recorded
+    for it, or None if the semester has no students.
+    """
+    engine = _writer(path())
+    label = label or date.today().isoformat()
+    try:
+        # 1. copy into the archive and record the summary
+        with engine.begin() as conn:
+            create_tables(conn)
+            summary = _summary(conn, sem)
+            if not summary["students"]:
+                return None
+            # referenced rows first, for the archive's foreign keys
+            wheres = {
+                Course: f"WHERE course_code IN (SELECT course_code FROM "
+                        f"main.marks WHERE usn IN ({COHORT}) UNION SELECT "
+                        f"course_code FROM main.teaches WHERE sem = :sem)",
+                Teacher: "WHERE tid IN (SELECT tid FROM main.teaches WHERE sem = :sem"
+                         f" UNION SELECT teacher_id FROM main.supplementary"
+                         f" WHERE usn IN ({COHORT}))",
+                Teaches: "WHERE sem = :sem",
+                Student: "WHERE sem = :sem",
+                Marks: f"WHERE usn IN ({COHORT})",
+                Supplementary: f"WHERE usn IN ({COHORT})",
+            }
+            for model, where in wheres.items():
+                _copy(conn, model, where, sem)
+            conn.execute(
+                translate(batches.insert().prefix_with("OR REPLACE")),
+                dict(summary, sem=sem, label=label,
+                     archived_at=datetime.now().isoformat(sep=" ", timespec="seconds")),
+            )
+
+        # 2. drop the cohort from the live tables (triggers keep stats,
+        # rollups and the search index in step)
+        with engine.begin() as conn:
+            for model in (Supplementary, Marks):
+                conn.execute(text(
+                    f"DELETE FROM main.{model.__tablename__} "
+                    f"WHERE usn IN ({COHORT})"
+                ), {"sem": sem})
+            conn.execute(
+                text("DELETE FROM main.student WHERE sem = :sem"), {"sem": sem}
+            )
+            conn.execute(text(
+                "INSERT OR IGNORE INTO main.table_version (name, version) "
+                "VALUES ('archive', 0)"
+            ))
+            conn.execute(text(
+                "UPDATE main.table_version SET version = version + 1 "
+                "WHERE name = 'archive'"
+            ))
+
+        # 3. compact the archive file
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(
+                text(f"VACUUM {SCHEMA}")
+            )
+    finally:
+        engine.dispose()
+    return summary
+
+
+# ---------------------------------------------------
+# CLI:  flask archive semester N | flask archive list
+# ---------------------------------------------------
+@click.group("archive")
+def archive_cli():
+    """Closed semester archive."""
+
+
+@archive_cli.command("semester")
+@click.argument("sem", type=int)
+@click.option("--label", help="Name of this cohort (default: today's date).")
+def semester_command(sem, label):
+    """Move semester SEM's students, marks and supplementaries to the archive."""
+    if not enabled():
+        raise click.ClickException("the archive needs a SQLite database")
+    summary = archive_semester(sem, label)
+    if summary is None:
+        click.echo(f"No students in semester {sem}.")
+        return
+    click.echo(
+        f"Archived semester {sem}: {summary['students']} student(s), "
+        f"{summary['marks_count']} marks row(s), "
+        f"{summary['supp_count']} supplementary row(s)."
+    )
+
+
+@archive_cli.command("list")
+def list_command():
+    """Show the archived batches."""
+    rows = summaries()
+    if not rows:
+        click.echo("The archive is empty.")
+    for r in rows:
+        click.echo(
+            f"sem {r['sem']}  {r['label']}  archived {r['archived_at']}  "
+            f"{r['students']} student(s), {r['marks_count']} marks row(s)"
+        )
@@ -0,0 +1,150 @@
+"""
+Concurrent read/write throughput of the database layer, before and after
+the config.py tuning.
+
+Runs the same mixed workload against two scratch SQLite files:
+
+  before  plain create_engine(url): rollback journal, default pool,
+          pysqlite's 5s lock timeout (what app.py used to do)
+  after   config.engine_options(url) + config.set_sqlite_pragmas (WAL,
+          synchronous=NORMAL, busy timeout, cache / mmap)
+
+Writers update one marks row per transaction, readers run the dashboard
+style band aggregate plus a point lookup.
+
+    python -m bench.concurrency --seconds 5 --writers 4 --readers 8
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+import config
+from models import db
+
+
+def build(url, students, courses):
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO student (usn, student_name, sem, section) "
+                 "VALUES (:usn, :name, 1, 'A')"),
+            [{"usn": f"S{i:06d}", "name": f"Student {i}"} for i in range(students)]
+        )
+        conn.execute(
+            text("INSERT INTO course (course_code, course_name, credit, sem) "
+                 "VALUES (:c, :c, 4, 1)"),
+            [{"c": f"C{j:02d}"} for j in range(courses)]
+        )
+        conn.execute(
+            text("INSERT INTO marks (usn, course_code, ia1, ia2, ia3, assignment, "
+                 "total_score, category) VALUES (:usn, :c, 10, 10, 10, 10, 20, 'yellow')"),
+            [{"usn": f"S{i:06d}", "c": f"C{j:02d}"}
+             for i in range(students) for j in range(courses)]
+        )
+    engine.dispose()
+
+
+def make_engine(url, tuned):
+    if not tuned:
+        return create_engine(url)
+    engine = create_engine(url, **config.engine_options(url))
+    event.listen(engine, "connect", config.set_sqlite_pragmas)
+    return engine
+
+
+def run(engine, seconds, writers, readers, students, courses):
+    stop = time.monotonic() + seconds
+    counts = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0}
+    lock = threading.Lock()
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer():
+        rnd = random.Random()
+        while time.monotonic() < stop:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        text("UPDATE marks SET ia1 = :v, total_score = :v "
+                             "WHERE usn = :usn AND course_code = :c"),
+                        {"v": rnd.randint(0, 30),
+                         "usn": f"S{rnd.randrange(students):06d}",
+                         "c": f"C{rnd.randrange(courses):02d}"}
+                    )
+                bump("writes")
+            except OperationalError:
+                bump("write_errors")
+
+    def reader():
+        rnd = random.Random()
+        while time.monotonic() < stop:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text(
+                        "SELECT category, COUNT(*) FROM marks GROUP BY category"
+                    )).all()
+                    conn.execute(
+                        text("SELECT * FROM marks WHERE usn = :usn"),
+                        {"usn": f"S{rnd.randrange(students):06d}"}
+                    ).all()
+                bump("reads")
+            except OperationalError:
+                bump("read_errors")
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    counts["reads_per_s"] = round(counts["reads"] / seconds, 1)
+    counts["writes_per_s"] = round(counts["writes"] / seconds, 1)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--courses", type=int, default=6)
+    parser.add_argument("--json", dest="json_path",
+                        help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("before", "after"):
+            url = f"sqlite:///{os.path.join(tmp, mode + '.db')}"
+            build(url, args.students, args.courses)
+            engine = make_engine(url, tuned=(mode == "after"))
+            results[mode] = run(
+                engine, args.seconds, args.writers, args.readers,
+                args.students, args.courses
+            )
+            engine.dispose()
+
+    print(f"{'mode':<8}{'reads/s':>10}{'writes/s':>10}{'read err':>10}{'write err':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<8}{r['reads_per_s']:>10}{r['writes_per_s']:>10}"
+              f"{r['read_errors']:>10}{r['write_errors']:>10}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump({"args": vars(args), "results": results}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
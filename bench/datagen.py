@@ -0,0 +1,128 @@
+"""
+Synthetic DPMS dataset generator.
+
+Fills an (already migrated) database with students, courses, teachers,
+teaches mappings, marks and supplementaries. Deterministic for a given
+seed, so runs on different commits see the same data.
+
+    python -m bench.datagen /tmp/dpms-bench.db --students 5000
+"""
+import argparse
+import os
+import random
+
+from sqlalchemy import insert
+
+import scoring
+from models import db, Student, Teacher, Course, Teaches, Marks, Supplementary
+
+SECTIONS = ("A", "B", "C")
+BATCH = 5000
+
+
+def _batched(table, rows):
+    for i in range(0, len(rows), BATCH):
+        db.session.execute(insert(table), rows[i:i + BATCH])
+
+
+def generate(students=2000, courses=24, teachers=30, marks_per_student=6,
+             supplementary=True, seed=42):
+    """Insert a synthetic dataset through the current app's session."""
+    rnd = random.Random(seed)
+
+    teacher_rows = [
+        {"tid": f"T{i:04d}", "teacher_name": f"Teacher {i}"}
+        for i in range(teachers)
+    ]
+    course_rows = [
+        {"course_code": f"C{i:03d}", "course_name": f"Course {i}",
+         "credit": rnd.choice((2, 3, 4)), "sem": i % 8 + 1}
+        for i in range(courses)
+    ]
+    student_rows = [
+        {"usn": f"S{i:06d}", "student_name": f"Student {i}",
+         "sem": i % 8 + 1, "section": SECTIONS[i // 8 % len(SECTIONS)]}
+        for i in range(students)
+    ]
+
+    by_sem = {}
+    for c in course_rows:
+        by_sem.setdefault(c["sem"], []).append(c["course_code"])
+
+    teaches_rows = [
+        {"tid": teacher_rows[i % teachers]["tid"], "course_code": c["course_code"],
+         "sem": c["sem"], "section": SECTIONS[i % len(SECTIONS)]}
+        for i, c in enumerate(course_rows)
+    ]
+
+    marks_rows = []
+    for s in student_rows:
+        options = by_sem.get(s["sem"]) or [c["course_code"] for c in course_rows]
+        for code in rnd.sample(options, min(marks_per_student, len(options))):
+            ia = [rnd.randint(0, 30) for _ in range(3)]
+            asg = rnd.randint(0, 20)
+            total, category = scoring.score(*ia, asg)
+            marks_rows.append({
+                "usn": s["usn"], "course_code": code,
+                "ia1": ia[0], "ia2": ia[1], "ia3": ia[2], "assignment": asg,
+                "total_score": total, "category": category,
+            })
+
+    owner = {t["course_code"]: t["tid"] for t in teaches_rows}
+    supp_rows = [
+        {"usn": m["usn"], "course_code": m["course_code"],
+         "teacher_id": owner[m["course_code"]]}
+        for m in marks_rows if supplementary and m["category"] == "red"
+    ]
+
+    _batched(Teacher, teacher_rows)
+    _batched(Course, course_rows)
+    _batched(Student, student_rows)
+    _batched(Teaches, teaches_rows)
+    _batched(Marks, marks_rows)
+    _batched(Supplementary, supp_rows)
+    db.session.commit()
+
+    return {
+        "students": len(student_rows), "courses": len(course_rows),
+        "teachers": len(teacher_rows), "teaches": len(teaches_rows),
+        "marks": len(marks_rows), "supplementary": len(supp_rows),
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--courses", type=int, default=24)
+    parser.add_argument("--teachers", type=int, default=30)
+    parser.add_argument("--marks-per-student", type=int, default=6)
+    parser.add_argument("--no-supplementary", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def sizes(args):
+    return {
+        "students": args.students, "courses": args.courses,
+        "teachers": args.teachers, "marks_per_student": args.marks_per_student,
+        "supplementary": not args.no_supplementary, "seed": args.seed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a scratch DPMS database.")
+    parser.add_argument("path", help="SQLite file to create (must not exist)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} already exists")
+    os.environ["DPMS_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.path)}"
+
+    from app import create_app
+    app = create_app()
+
+    with app.app_context():
+        print(generate(**sizes(args)))
+
+
+if __name__ == "__main__":
+    main()
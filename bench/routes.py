@@ -0,0 +1,256 @@
+"""
+Per-route latency / throughput benchmark.
+
+Builds a synthetic dataset (bench.datagen) in a scratch SQLite file, then
+drives every endpoint either through the Flask test client or through a
+local threaded WSGI server with concurrent HTTP clients, and reports
+p50/p95/p99 latency, SQL statements per request and requests/s.
+
+Results are written as JSON (with the git commit) so runs can be compared:
+
+    python -m bench.routes --students 5000 --out bench/results/base.json
+    python -m bench.routes --students 5000 --compare bench/results/base.json
+    python -m bench.routes --server --concurrency 8
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+from bench import datagen
+
+# (name, method, path, form data)
+ENDPOINTS = [
+    ("dashboard", "GET", "/", None),
+    ("students", "GET", "/students", None),
+    ("students_filtered", "GET", "/students?sem=3&section=A", None),
+    ("teachers", "GET", "/teachers", None),
+    ("courses", "GET", "/courses", None),
+    ("monitor", "GET", "/monitor", None),
+    ("monitor_red", "GET", "/monitor?band=red", None),
+    ("band_analysis", "GET", "/band-analysis", None),
+    ("supplementary", "GET", "/supplementary", None),
+    ("red_report", "GET", "/red-report", None),
+    ("add_marks_page", "GET", "/add-marks-page", None),
+    ("marks_bulk_grid", "GET", "/marks-bulk?sem=1&section=A&course=C000", None),
+    # submit-only: the assignment itself runs as a background job (jobs.py)
+    ("add_supplementary_submit", "POST", "/add-supplementary",
+     {"teacher_id": "T0000", "sem": "1"}),
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1,
+                   int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def summarize(latencies, queries, wall):
+    lat = sorted(latencies)
+    return {
+        "requests": len(lat),
+        "p50_ms": round(percentile(lat, 50) * 1000, 2),
+        "p95_ms": round(percentile(lat, 95) * 1000, 2),
+        "p99_ms": round(percentile(lat, 99) * 1000, 2),
+        "mean_ms": round(sum(lat) / len(lat) * 1000, 2) if lat else 0,
+        "queries_per_request": round(sum(queries) / len(queries), 1) if queries else 0,
+        "throughput_rps": round(len(lat) / wall, 1) if wall else 0,
+    }
+
+
+def instrument(app, db):
+    """Count SQL statements per request and report them in a header."""
+    from sqlalchemy import event
+
+    local = threading.local()
+
+    @event.listens_for(db.engine, "before_cursor_execute")
+    def _count(*args):
+        local.count = getattr(local, "count", 0) + 1
+
+    @app.before_request
+    def _reset():
+        local.count = 0
+
+    @app.after_request
+    def _report(response):
+        response.headers["X-Bench-Queries"] = str(getattr(local, "count", 0))
+        return response
+
+
+# ---------------------------------------------------
+# DRIVERS
+# ---------------------------------------------------
+def _client_worker(app, method, path, data, n, out):
+    client = app.test_client()
+    client.post("/login", data={"teacher_name": "Teacher 0"})
+    for _ in range(n):
+        start = time.perf_counter()
+        resp = client.open(path, method=method, data=data)
+        elapsed = time.perf_counter() - start
+        resp.close()
+        if resp.status_code >= 400:
+            raise RuntimeError(f"{method} {path} -> {resp.status_code}")
+        out.append((elapsed, int(resp.headers.get("X-Bench-Queries", 0))))
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # time the request itself, like the test client does, not the page
+    # it redirects to
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _http_worker(base, method, path, data, n, out):
+    jar = CookieJar()
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(jar), _NoRedirect
+    )
+    login = urllib.parse.urlencode({"teacher_name": "Teacher 0"}).encode()
+    try:
+        opener.open(base + "/login", login).read()
+    except urllib.error.HTTPError as exc:
+        if exc.code >= 400:
+            raise
+
+    body = urllib.parse.urlencode(data).encode() if data else None
+    for _ in range(n):
+        req = urllib.request.Request(base + path, data=body, method=method)
+        start = time.perf_counter()
+        try:
+            resp = opener.open(req)
+        except urllib.error.HTTPError as exc:
+            if exc.code >= 400:
+                raise RuntimeError(f"{method} {path} -> {exc.code}")
+            resp = exc
+        with resp:
+            resp.read()
+            queries = int(resp.headers.get("X-Bench-Queries", 0))
+        out.append((time.perf_counter() - start, queries))
+
+
+def bench_endpoint(worker, target, method, path, data, requests, concurrency):
+    worker(target, method, path, data, 1, [])  # warm-up
+    per_thread = max(1, requests // concurrency)
+    results = []
+    threads = [
+        threading.Thread(target=worker,
+                         args=(target, method, path, data, per_thread, results))
+        for _ in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    return summarize([r[0] for r in results], [r[1] for r in results], wall)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as fh:
+        base = json.load(fh)["endpoints"]
+    print(f"\nvs {baseline_path}")
+    print(f"{'endpoint':<20}{'p95 before':>12}{'p95 now':>10}{'change':>9}")
+    for name, r in current.items():
+        if name not in base:
+            continue
+        old, new = base[name]["p95_ms"], r["p95_ms"]
+        change = f"{(new - old) / old * 100:+.0f}%" if old else "n/a"
+        print(f"{name:<20}{old:>12}{new:>10}{change:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every DPMS route.")
+    datagen.add_arguments(parser)
+    parser.add_argument("--requests", type=int, default=50,
+                        help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--server", action="store_true",
+                        help="use a threaded WSGI server + HTTP clients")
+    parser.add_argument("--only", help="comma separated endpoint names")
+    parser.add_argument("--out", help="write JSON results here")
+    parser.add_argument("--compare", help="baseline JSON to compare with")
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix="dpms-bench-")
+    os.environ["DPMS_DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+
+    from app import create_app
+    from models import db
+
+    app = create_app()
+
+    with app.app_context():
+        instrument(app, db)
+        counts = datagen.generate(**datagen.sizes(args))
+    print(f"dataset: {counts}", file=sys.stderr)
+
+    server = None
+    if args.server:
+        from werkzeug.serving import make_server
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        worker, target = _http_worker, f"http://127.0.0.1:{server.server_port}"
+    else:
+        worker, target = _client_worker, app
+
+    wanted = set(args.only.split(",")) if args.only else None
+    results = {}
+    try:
+        for name, method, path, data in ENDPOINTS:
+            if wanted and name not in wanted:
+                continue
+            results[name] = bench_endpoint(
+                worker, target, method, path, data,
+                args.requests, args.concurrency
+            )
+            r = results[name]
+            print(f"{name:<20} p50 {r['p50_ms']:>8}ms  p95 {r['p95_ms']:>8}ms  "
+                  f"p99 {r['p99_ms']:>8}ms  q/req {r['queries_per_request']:>6}  "
+                  f"{r['throughput_rps']:>8} req/s")
+    finally:
+        if server:
+            server.shutdown()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mode": "server" if args.server else "client",
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "dataset": counts,
+        "endpoints": results,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Set-based bulk write helpers.
+
+Each helper does its whole job in a fixed number of statements inside the
+caller's transaction; callers commit.
+"""
+from collections import defaultdict
+
+from sqlalchemy import select, insert, exists, literal, func, and_
+from sqlalchemy.dialects import postgresql, sqlite
+
+import scoring
+from models import db, Student, Teacher, Course, Teaches, Marks, Supplementary
+
+IA_MAX = 30
+ASSIGNMENT_MAX = 20
+
+MARK_FIELDS = (("ia1", IA_MAX), ("ia2", IA_MAX), ("ia3", IA_MAX),
+               ("assignment", ASSIGNMENT_MAX))
+SEMESTERS = range(1, 9)
+SECTIONS = ("A", "B", "C")
+
+
+def red_band_filter(course_codes=None, sem=None):
+    """Red-band Marks rows of the given courses and / or semester."""
+    conds = [Marks.category == "red"]
+    if course_codes:
+        conds.append(Marks.course_code.in_(course_codes))
+    if sem is not None:
+        conds.append(
+            Marks.course_code.in_(
+                select(Course.course_code).where(Course.sem == sem)
+            )
+        )
+    return and_(*conds)
+
+
+def assign_supplementary(teacher_id, course_codes=None, sem=None):
+    """
+    Put every red-band (usn, course) for the given courses and/or semester
+    under ``teacher_id`` with one INSERT ... SELECT ... WHERE NOT EXISTS.
+
+    Returns (created, skipped); skipped rows already had this teacher.
+    """
+    if not course_codes and sem is None:
+        raise ValueError("course_codes or sem is required")
+
+    red = red_band_filter(course_codes, sem)
+
+    candidates = db.session.execute(
+        select(func.count()).select_from(Marks).where(red)
+    ).scalar()
+    if not candidates:
+        return 0, 0
+
+    already = exists().where(
+        Supplementary.usn == Marks.usn,
+        Supplementary.course_code == Marks.course_code,
+        Supplementary.teacher_id == teacher_id,
+    )
+    stmt = insert(Supplementary).from_select(
+        ["usn", "course_code", "teacher_id"],
+        select(Marks.usn, Marks.course_code, literal(teacher_id))
+        .where(red, ~already),
+    )
+    created = db.session.execute(stmt).rowcount
+
+    return created, candidates - created
+
+
+def validate_marks_rows(course_code, rows):
+    """
+    Check raw marks rows in memory against preloaded key sets.
+
+    ``rows`` is a list of dicts with usn + the MARK_FIELDS as strings; rows
+    with every mark blank are dropped. Returns (clean_rows, errors).
+    """
+    errors = []
+    if not db.session.get(Course, course_code):
+        return [], [f"Course code {course_code} not found"]
+
+    usns = {r["usn"] for r in rows if r.get("usn")}
+    known = {
+        usn for (usn,) in db.session.execute(
+            select(Student.usn).where(Student.usn.in_(usns))
+        )
+    } if usns else set()
+
+    clean = []
+    for r in rows:
+        usn = r.get("usn")
+        raw = [(r.get(f) or "").strip() for f, _ in MARK_FIELDS]
+        if not any(raw):
+            continue
+        if usn not in known:
+            errors.append(f"{usn}: USN not found")
+            continue
+        try:
+            values = [int(v or 0) for v in raw]
+        except ValueError:
+            errors.append(f"{usn}: marks must be numbers")
+            continue
+        bad = [f for (f, hi), v in zip(MARK_FIELDS, values) if not 0 <= v <= hi]
+        if bad:
+            errors.append(f"{usn}: {', '.join(bad)} out of range")
+            continue
+        row = dict(zip((f for f, _ in MARK_FIELDS), values))
+        row.update(usn=usn, course_code=course_code)
+        clean.append(row)
+    return clean, errors
+
+
+def upsert_marks(rows, updated_by=None):
+    """
+    Write validated marks rows with a single executemany upsert on
+    (usn, course_code). ``updated_by`` (a tid) ends up in marks_log.
+    Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+
+    params = []
+    for r in rows:
+        total, category = scoring.score(
+            r["ia1"], r["ia2"], r["ia3"], r["assignment"]
+        )
+        params.append(dict(r, total_score=total, category=category,
+                           updated_by=updated_by))
+
+    dialect = postgresql if db.engine.dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(Marks)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Marks.usn, Marks.course_code],
+        set_={
+            c: stmt.excluded[c]
+            for c in ("ia1", "ia2", "ia3", "assignment", "total_score", "category",
+                      "updated_by")
+        },
+    )
+    db.session.execute(stmt, params)
+    return len(params)
+
+
+def validate_teaches_rows(rows):
+    """
+    Check a batch of teaching assignments in memory.
+
+    ``rows`` is a list of dicts with tid, course_code, sem and section as
+    strings (blank section: every section). Teachers, courses and the
+    current Teaches rows are loaded once up front, then each row is checked
+    against them and against the rows before it in the batch:
+
+      * the teacher and course exist, sem is 1-8 and matches the course's
+        semester when it has one, section is A-C or blank
+      * a teacher has one Teaches row per course (its primary key)
+      * a (course, sem, section) slot has one teacher; a blank section
+        takes every section of the course and a blank sem (legacy rows)
+        every semester
+
+    Rows identical to an existing assignment are dropped. Returns
+    (clean_rows, errors).
+    """
+    teachers = {str(tid) for (tid,) in db.session.execute(select(Teacher.tid))}
+    course_sems = dict(db.session.execute(select(Course.course_code, Course.sem)).all())
+    assigned = {}                   # (tid, course_code) -> (sem, section)
+    slots = defaultdict(list)       # course_code -> [(sem, section, tid)]
+    for tid, code, sem, section in db.session.execute(
+        select(Teaches.tid, Teaches.course_code, Teaches.sem, Teaches.section)
+    ):
+        assigned[(str(tid), code)] = (sem, section)
+        slots[code].append((sem, section, str(tid)))
+
+    def overlaps(a, b):
+        # NULL sem / section is a wildcard on either side
+        return a is None or b is None or a == b
+
+    def holder(code, sem, section):
+        """Teacher already holding a slot overlapping this one, or None."""
+        for s_sem, s_section, s_tid in slots[code]:
+            if overlaps(sem, s_sem) and overlaps(section, s_section):
+                return s_tid
+        return None
+
+    clean, errors = [], []
+    for r in rows:
+        tid = (r.get("tid") or "").strip()
+        code = (r.get("course_code") or "").strip()
+        section = (r.get("section") or "").strip().upper() or None
+        label = f"{tid} / {code}{' / ' + section if section else ''}"
+        if not tid or not code:
+            errors.append(f"{label}: teacher and course are required")
+            continue
+        if tid not in teachers:
+            errors.append(f"{label}: teacher not found")
+            continue
+        if code not in course_sems:
+            errors.append(f"{label}: course not found")
+            continue
+        try:
+            sem = int(r.get("sem") or course_sems[code] or 0)
+        except ValueError:
+            sem = 0
+        if sem not in SEMESTERS:
+            errors.append(f"{label}: sem must be 1-8")
+            continue
+        if course_sems[code] and course_sems[code] != sem:
+            errors.append(f"{label}: {code} is a sem {course_sems[code]} course")
+            continue
+        if section is not None and section not in SECTIONS:
+            errors.append(f"{label}: section must be one of {', '.join(SECTIONS)}")
+            continue
+
+        current = assigned.get((tid, code))
+        if current == (sem, section):
+            continue
+        if current is not None:
+            errors.append(
+                f"{label}: {tid} already teaches {code} "
+                f"(sem {current[0]}, section {current[1] or 'all'})"
+            )
+            continue
+        other = holder(code, sem, section)
+        if other is not None:
+            errors.append(
+                f"{label}: section {section or 'all'} of {code} "
+                f"is already taken by {other}"
+            )
+            continue
+
+        assigned[(tid, code)] = (sem, section)
+        slots[code].append((sem, section, tid))
+        clean.append({"tid": tid, "course_code": code,
+                      "sem": sem, "section": section})
+    return clean, errors
+
+
+def insert_teaches(rows):
+    """
+    Write validated Teaches rows with a single multi-row INSERT.
+    Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    db.session.execute(insert(Teaches).values(rows))
+    return len(rows)
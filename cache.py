@@ -0,0 +1,194 @@
+"""
+In-process result cache keyed on table versions.
+
+Every write to a base table bumps its row in ``table_version`` (via the
+version_* triggers, so bulk statements and other triggers count too). A
+cached result remembers the versions it was computed at; a lookup reads the
+current versions with one primary-key query and recomputes only if one of
+them has moved. Nothing needs to remember to invalidate.
+
+Under a multi-process server each worker would otherwise compute every
+report once for itself. With DPMS_SHARED_CACHE set (a file name under
+instance/, wsgi.py defaults it to cache.db) results are also stored in a
+small SQLite file every worker on the box reads: a local miss checks the
+shared copy before computing. Shared entries carry the versions they were
+computed at and are only served for exactly those versions, so they are as
+coherent as the local ones.
+
+    DPMS_SHARED_CACHE       shared cache file ("" = off, the default)
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import text, select
+
+from models import db, TableVersion
+
+VERSIONED_TABLES = (
+    "student", "teacher", "course", "teaches", "marks", "supplementary",
+)
+
+MAX_ENTRIES = 256
+SHARED_MAX_ENTRIES = 2048
+SHARED_PRUNE_EVERY = 100    # puts between trims of the shared file
+SHARED_TIMEOUT = 0.5        # seconds; a busy cache file counts as a miss
+
+
+def version_triggers():
+    ddl = []
+    for table in VERSIONED_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            ddl.append(f"""
+            CREATE TRIGGER IF NOT EXISTS version_{table}_{event.lower()}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE table_version SET version = version + 1
+                WHERE name = '{table}';
+            END
+            """)
+    return ddl
+
+
+def install():
+    """Seed table_version rows and create the triggers. Caller commits."""
+    for table in VERSIONED_TABLES:
+        db.session.execute(
+            text("INSERT OR IGNORE INTO table_version (name, version) "
+                 "VALUES (:name, 0)"),
+            {"name": table}
+        )
+    for ddl in version_triggers():
+        db.session.execute(text(ddl))
+
+
+def versions(*tables):
+    """Current version of each table, as a tuple in the order given."""
+    rows = dict(db.session.execute(
+        select(TableVersion.name, TableVersion.version)
+        .where(TableVersion.name.in_(tables))
+    ).all())
+    return tuple(rows.get(t, 0) for t in tables)
+
+
+class SharedStore:
+    """
+    Cross-process tier of VersionedCache: one SQLite file, one connection
+    per thread. It is only a cache, so it runs with synchronous=OFF and
+    any error reads as a miss instead of failing the request.
+    """
+    def __init__(self, path, maxsize=SHARED_MAX_ENTRIES):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._puts = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entry ("
+            " key TEXT PRIMARY KEY, versions TEXT NOT NULL,"
+            " value BLOB NOT NULL, stored_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SHARED_TIMEOUT)
+            conn.execute("PRAGMA synchronous = OFF")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, versions):
+        """The value stored for ``key`` at exactly ``versions``, or None."""
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM entry WHERE key = ? AND versions = ?",
+                (repr(key), repr(versions))
+            ).fetchone()
+            return None if row is None else (pickle.loads(row[0]),)
+        except (sqlite3.Error, pickle.UnpicklingError):
+            return None
+
+    def put(self, key, versions, value):
+        try:
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            conn = self._conn()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entry VALUES (?, ?, ?, ?)",
+                    (repr(key), repr(versions), blob, time.time())
+                )
+                self._puts += 1
+                if self._puts % SHARED_PRUNE_EVERY == 0:
+                    conn.execute(
+                        "DELETE FROM entry WHERE key NOT IN (SELECT key FROM"
+                        " entry ORDER BY stored_at DESC LIMIT ?)",
+                        (self.maxsize,)
+                    )
+        except (sqlite3.Error, pickle.PicklingError):
+            pass
+
+    def clear(self):
+        try:
+            with self._conn() as conn:
+                conn.execute("DELETE FROM entry")
+        except sqlite3.Error:
+            pass
+
+
+class VersionedCache:
+    def __init__(self, maxsize=MAX_ENTRIES, shared=None):
+        self.maxsize = maxsize
+        self.shared = shared
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, tables, compute):
+        """
+        Return the cached value for ``key`` if none of ``tables`` changed
+        since it was stored, else call ``compute()`` and store the result.
+        """
+        current = versions(*tables)
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None and hit[0] == current:
+                self._data.move_to_end(key)
+                return hit[1]
+
+        shared = self.shared.get(key, current) if self.shared else None
+        if shared is not None:
+            value = shared[0]
+        else:
+            value = compute()
+            if self.shared:
+                self.shared.put(key, current, value)
+        with self._lock:
+            self._data[key] = (current, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self.shared:
+            self.shared.clear()
+
+
+results = VersionedCache()
+
+
+def init_app(app):
+    """Attach the shared tier if DPMS_SHARED_CACHE names a file."""
+    name = app.config.setdefault(
+        "SHARED_CACHE", os.environ.get("DPMS_SHARED_CACHE") or ""
+    )
+    if not name:
+        return
+    os.makedirs(app.instance_path, exist_ok=True)
+    results.shared = SharedStore(os.path.join(app.instance_path, name))
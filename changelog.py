@@ -0,0 +1,114 @@
+"""
+Append-only change log for marks.
+
+Triggers on marks append one ``marks_log`` row per insert, IA change and
+delete, with the old and new IA marks, total and band, plus the tid from
+``marks.updated_by``. The app's write paths set that column; imports and
+deletes log NULL. ``seq`` is AUTOINCREMENT, so a consumer keeps its own
+high-water mark and asks only for what is newer:
+
+    GET /api/v1/marks/changes?since=1234&limit=500
+
+The new total and band are computed inside the trigger with the scoring
+engine's SQL rather than read back from the row, so they do not depend on
+whether SQLite fires this trigger before or after calc_category.
+"""
+from sqlalchemy import text
+
+from models import db, MarksLog
+import scoring
+
+MAX_LIMIT = 5000
+
+_IA = ("ia1", "ia2", "ia3", "assignment")
+_COLUMNS = (
+    "op, usn, course_code, "
+    "old_ia1, old_ia2, old_ia3, old_assignment, old_total, old_category, "
+    "new_ia1, new_ia2, new_ia3, new_assignment, new_total, new_category, tid"
+)
+
+
+def _values(op, old, new, tid):
+    def side(prefix, stored):
+        if prefix is None:
+            return "NULL, NULL, NULL, NULL, NULL, NULL"
+        ia = ", ".join(f"{prefix}.{c}" for c in _IA)
+        if stored:
+            return f"{ia}, {prefix}.total_score, {prefix}.category"
+        total = scoring.total_sql(f"{prefix}.")
+        return f"{ia}, {total}, {scoring.category_sql(total)}"
+
+    key = new or old
+    return (
+        f"INSERT INTO marks_log ({_COLUMNS}) VALUES ('{op}', "
+        f"{key}.usn, {key}.course_code, {side(old, True)}, "
+        f"{side(new, False)}, {tid});"
+    )
+
+
+def trigger_ddl():
+    """DROP + CREATE statements for the marks_log triggers."""
+    changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in _IA)
+    return [
+        "DROP TRIGGER IF EXISTS marks_log_insert",
+        "DROP TRIGGER IF EXISTS marks_log_update",
+        "DROP TRIGGER IF EXISTS marks_log_delete",
+        "CREATE TRIGGER marks_log_insert\nAFTER INSERT ON marks\n"
+        f"BEGIN\n    {_values('I', None, 'NEW', 'NEW.updated_by')}\nEND",
+        "CREATE TRIGGER marks_log_update\n"
+        "AFTER UPDATE OF ia1, ia2, ia3, assignment ON marks\n"
+        f"WHEN {changed}\n"
+        f"BEGIN\n    {_values('U', 'OLD', 'NEW', 'NEW.updated_by')}\nEND",
+        "CREATE TRIGGER marks_log_delete\nAFTER DELETE ON marks\n"
+        f"BEGIN\n    {_values('D', 'OLD', None, 'NULL')}\nEND",
+    ]
+
+
+def install_triggers():
+    """(Re)create the marks_log triggers. Caller commits."""
+    for sql in trigger_ddl():
+        db.session.execute(text(sql))
+
+
+def add_updated_by():
+    """Add marks.updated_by to databases created before it existed."""
+    columns = {row[1] for row in db.session.execute(text("PRAGMA table_info(marks)"))}
+    if "updated_by" not in columns:
+        db.session.execute(text("ALTER TABLE marks ADD COLUMN updated_by TEXT"))
+
+
+def as_dict(entry):
+    def side(prefix):
+        values = {c: getattr(entry, f"{prefix}_{c}") for c in _IA}
+        values["total_score"] = getattr(entry, f"{prefix}_total")
+        values["category"] = getattr(entry, f"{prefix}_category")
+        return values
+
+    return {
+        "seq": entry.seq,
+        "op": entry.op,
+        "usn": entry.usn,
+        "course_code": entry.course_code,
+        "old": side("old") if entry.op != "I" else None,
+        "new": side("new") if entry.op != "D" else None,
+        "tid": entry.tid,
+        "changed_at": entry.changed_at.isoformat(sep=" ") if entry.changed_at else None,
+    }
+
+
+def changes_since(seq=0, limit=500, usn=None, course=None):
+    """Log entries with seq > ``seq``, oldest first."""
+    query = MarksLog.query.filter(MarksLog.seq > seq)
+    if usn:
+        query = query.filter(MarksLog.usn == usn)
+    if course:
+        query = query.filter(MarksLog.course_code == course)
+    return query.order_by(MarksLog.seq).limit(max(1, min(limit, MAX_LIMIT))).all()
+
+
+def history(usn, course_code=None, limit=20):
+    """Most recent changes to a student's marks (or one row), newest first."""
+    query = MarksLog.query.filter_by(usn=usn)
+    if course_code:
+        query = query.filter_by(course_code=course_code)
+    return query.order_by(MarksLog.seq.desc()).limit(limit).all()
@@ -0,0 +1,106 @@
+"""
+Database configuration.
+
+Everything is read from the environment so deployments do not edit code:
+
+    DPMS_DATABASE_URL    default sqlite:///DPMS.db (relative to instance/)
+                         e.g. postgresql+psycopg2://dpms:pw@localhost/dpms
+    DPMS_POOL_SIZE       connections kept open   (sqlite 10, postgres 20)
+    DPMS_MAX_OVERFLOW    extra connections under burst (sqlite 20, postgres 10)
+    DPMS_POOL_TIMEOUT    seconds to wait for a pooled connection (30)
+    DPMS_BUSY_TIMEOUT_MS sqlite: how long a writer waits on a lock (15000)
+
+On SQLite every new connection gets the pragmas below: WAL so readers never
+block behind a writer, synchronous=NORMAL (safe with WAL, far fewer fsyncs),
+a busy timeout instead of immediate "database is locked", a larger page
+cache / mmap window, and enforced foreign keys (SQLite leaves them off by
+default, so ON DELETE CASCADE never fired and orphans piled up; see
+maintenance.py).
+"""
+import os
+import sqlite3
+
+from sqlalchemy import event
+
+DEFAULT_DATABASE_URL = "sqlite:///DPMS.db"
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,       # negative = KiB, so ~64 MB per connection
+    "mmap_size": 268435456,     # 256 MB
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+}
+
+POOL_DEFAULTS = {
+    "sqlite": {"pool_size": 10, "max_overflow": 20},
+    "postgresql": {"pool_size": 20, "max_overflow": 10},
+}
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def database_url():
+    return os.environ.get("DPMS_DATABASE_URL") or DEFAULT_DATABASE_URL
+
+
+def busy_timeout_ms():
+    return _env_int("DPMS_BUSY_TIMEOUT_MS", 15000)
+
+
+def backend(url):
+    return url.split(":", 1)[0].split("+", 1)[0]
+
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS for ``url``, sized per backend."""
+    kind = backend(url)
+
+    if kind == "sqlite":
+        if url in ("sqlite://", "sqlite:///:memory:"):
+            # in-memory databases live in a single connection
+            return {}
+        return {
+            "pool_size": _env_int("DPMS_POOL_SIZE", POOL_DEFAULTS["sqlite"]["pool_size"]),
+            "max_overflow": _env_int("DPMS_MAX_OVERFLOW", POOL_DEFAULTS["sqlite"]["max_overflow"]),
+            "pool_timeout": _env_int("DPMS_POOL_TIMEOUT", 30),
+            "connect_args": {
+                "timeout": busy_timeout_ms() / 1000,
+                "check_same_thread": False,
+            },
+        }
+
+    defaults = POOL_DEFAULTS.get(kind, POOL_DEFAULTS["postgresql"])
+    return {
+        "pool_size": _env_int("DPMS_POOL_SIZE", defaults["pool_size"]),
+        "max_overflow": _env_int("DPMS_MAX_OVERFLOW", defaults["max_overflow"]),
+        "pool_timeout": _env_int("DPMS_POOL_TIMEOUT", 30),
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record=None):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {busy_timeout_ms()}")
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+def init_app(app, db):
+    """Point ``db`` at the configured database and tune its engine."""
+    url = database_url()
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(url)
+    db.init_app(app)
+
+    if backend(url) == "sqlite":
+        with app.app_context():
+            event.listen(db.engine, "connect", set_sqlite_pragmas)
@@ -0,0 +1,175 @@
+"""
+Marks sheet export to CSV / XLSX.
+
+Rows come straight off a server-side cursor (``yield_per``) and are written
+to the file as they arrive, so a whole-college sheet costs the same memory
+as a single section. XLSX uses openpyxl's write-only workbook, which also
+streams rows to disk.
+
+Exports started from the web run as background jobs (see jobs.py) and are
+saved under ``instance/exports`` for later download. The ExportRun row
+records their status and the file path.
+
+    flask export --sem 5 --section A
+    flask export --course CS501 --format xlsx --out cs501.xlsx
+"""
+import csv
+import os
+
+import click
+from flask import current_app
+from sqlalchemy import select
+
+from models import db, Student, Course, Marks, ExportRun
+
+FORMATS = ("csv", "xlsx")
+BATCH = 1000
+
+HEADER = (
+    "USN", "Student", "Sem", "Section", "Course", "Course Name",
+    "IA1", "IA2", "IA3", "Assignment", "Total", "Band",
+)
+
+
+def sheet_query(sem=None, section=None, course=None):
+    stmt = (
+        select(
+            Marks.usn, Student.student_name, Student.sem, Student.section,
+            Marks.course_code, Course.course_name,
+            Marks.ia1, Marks.ia2, Marks.ia3, Marks.assignment,
+            Marks.total_score, Marks.category,
+        )
+        .join(Student, Student.usn == Marks.usn)
+        .join(Course, Course.course_code == Marks.course_code, isouter=True)
+    )
+    if sem:
+        stmt = stmt.where(Student.sem == sem)
+    if section:
+        stmt = stmt.where(Student.section == section)
+    if course:
+        stmt = stmt.where(Marks.course_code == course)
+    return stmt.order_by(Marks.course_code, Student.section, Marks.usn)
+
+
+def sheet_rows(sem=None, section=None, course=None):
+    """Yield marks sheet rows as tuples, fetched BATCH at a time."""
+    result = db.session.execute(
+        sheet_query(sem, section, course).execution_options(yield_per=BATCH)
+    )
+    for rows in result.partitions():
+        yield from (tuple(r) for r in rows)
+
+
+# ---------------------------------------------------
+# WRITERS
+# each takes a path and an iterable of rows and returns the row count
+# ---------------------------------------------------
+def write_csv(path, rows):
+    n = 0
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(HEADER)
+        for row in rows:
+            writer.writerow(row)
+            n += 1
+    return n
+
+
+def write_xlsx(path, rows):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise click.ClickException("XLSX export needs openpyxl installed")
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Marks")
+    ws.append(HEADER)
+    n = 0
+    for row in rows:
+        ws.append(row)
+        n += 1
+    wb.save(path)
+    return n
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx}
+
+
+def xlsx_available():
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_sheet(path, fmt="csv", sem=None, section=None, course=None):
+    """Write one marks sheet to ``path``. Returns the row count."""
+    if fmt not in WRITERS:
+        raise ValueError(f"unknown export format: {fmt}")
+    return WRITERS[fmt](path, sheet_rows(sem, section, course))
+
+
+# ---------------------------------------------------
+# BACKGROUND RUNS
+# ---------------------------------------------------
+def export_folder(app=None):
+    folder = os.path.join((app or current_app).instance_path, "exports")
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def run_filename(run):
+    parts = ["marks"]
+    if run.sem:
+        parts.append(f"sem{run.sem}")
+    if run.section:
+        parts.append(run.section)
+    if run.course_code:
+        parts.append(run.course_code)
+    if len(parts) == 1:
+        parts.append("all")
+    return f"{'-'.join(parts)}-{run.id}.{run.fmt}"
+
+
+def run_export(run_id):
+    """Generate the file for ExportRun ``run_id``. Needs an app context."""
+    run = db.session.get(ExportRun, run_id)
+    run.status = "running"
+    db.session.commit()
+
+    path = os.path.join(export_folder(), run_filename(run))
+    try:
+        rows = export_sheet(path, run.fmt, run.sem, run.section, run.course_code)
+    except Exception as exc:
+        db.session.rollback()
+        run.status = "failed"
+        run.error = str(exc)[:500]
+        db.session.commit()
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    run.rows = rows
+    run.path = path
+    run.status = "done"
+    db.session.commit()
+    return run
+
+
+# ---------------------------------------------------
+# CLI:  flask export [--sem N] [--section S] [--course C] [--format csv|xlsx]
+# ---------------------------------------------------
+@click.command("export")
+@click.option("--sem", type=int)
+@click.option("--section")
+@click.option("--course")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default="csv",
+              show_default=True)
+@click.option("--out", type=click.Path(dir_okay=False),
+              help="Output file (default: marks.<format>).")
+def export_command(sem, section, course, fmt, out):
+    """Write a marks sheet for a section, a course or the whole college."""
+    out = out or f"marks.{fmt}"
+    rows = export_sheet(out, fmt, sem, section, course)
+    click.echo(f"{rows} row(s) written to {out}")
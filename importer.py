@@ -0,0 +1,309 @@
+"""
+Streaming CSV / XLSX import for students, courses and marks.
+
+Rows flow through a generator pipeline (read -> chunk -> validate -> insert)
+so memory stays flat however large the file is. Each chunk is validated
+against the model constraints with one key lookup per chunk, written with a
+Core ``insert()`` (marks go through the ``bulk.upsert_marks`` upsert) and
+committed together with the ImportRun progress row. Re-running the same
+file resumes after the last committed chunk.
+
+Rejected rows are appended to a CSV next to the source with the reason.
+
+    flask import students students.csv
+    flask import marks marks.xlsx --chunk-size 1000
+"""
+import csv
+import os
+from itertools import islice
+
+import click
+from sqlalchemy import insert, select
+
+import bulk
+from models import db, Student, Course, ImportRun
+from refdata import refdata
+
+CHUNK_SIZE = 500
+# keys the CSV reader adds to a row that does not match the header
+EXTRA = "_extra"
+MALFORMED = "_malformed"
+SEMESTERS = bulk.SEMESTERS
+SECTIONS = bulk.SECTIONS
+
+
+# ---------------------------------------------------
+# READERS
+# ---------------------------------------------------
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as fh:
+        reader = csv.DictReader(fh, restkey=EXTRA)
+        for row in reader:
+            extra = row.pop(EXTRA, None)
+            out = {(k or "").strip().lower(): (v or "").strip()
+                   for k, v in row.items()}
+            # a row that does not line up with the header is rejected
+            # whole rather than read into the wrong columns
+            if extra is not None:
+                out[EXTRA] = ",".join(extra)
+                out[MALFORMED] = "too many columns"
+            elif None in row.values():
+                out[MALFORMED] = "too few columns"
+            yield out
+
+
+def _read_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise click.ClickException("XLSX import needs openpyxl installed")
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h or "").strip().lower() for h in next(rows, ())]
+        for values in rows:
+            yield {
+                h: ("" if v is None else str(v).strip())
+                for h, v in zip(header, values)
+            }
+    finally:
+        wb.close()
+
+
+def read_rows(path):
+    if path.lower().endswith(".xlsx"):
+        return _read_xlsx(path)
+    return _read_csv(path)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ---------------------------------------------------
+# VALIDATORS
+# each takes a chunk of raw dicts and returns (good, bad) where good is a
+# list of insert params and bad a list of (raw_row, reason)
+# ---------------------------------------------------
+def _opt_int(value, allowed=None):
+    if value == "":
+        return None
+    n = int(float(value))
+    if allowed is not None and n not in allowed:
+        raise ValueError
+    return n
+
+
+def _existing(column, keys):
+    if not keys:
+        return set()
+    return {k for (k,) in db.session.execute(select(column).where(column.in_(keys)))}
+
+
+def _check_students(chunk):
+    good, bad, seen = [], [], set()
+    taken = _existing(Student.usn, {r.get("usn") for r in chunk})
+
+    for r in chunk:
+        usn = r.get("usn", "")
+        name = r.get("student_name") or r.get("name", "")
+        if not usn or not name:
+            bad.append((r, "usn and student_name are required"))
+            continue
+        if usn in taken or usn in seen:
+            bad.append((r, "USN already exists"))
+            continue
+        try:
+            sem = _opt_int(r.get("sem", ""), SEMESTERS)
+        except (ValueError, OverflowError):
+            bad.append((r, "sem must be 1-8"))
+            continue
+        section = r.get("section", "").upper() or None
+        if section is not None and section not in SECTIONS:
+            bad.append((r, f"section must be one of {', '.join(SECTIONS)}"))
+            continue
+        seen.add(usn)
+        good.append({"usn": usn, "student_name": name,
+                     "sem": sem, "section": section})
+    return good, bad
+
+
+def _check_courses(chunk):
+    good, bad, seen = [], [], set()
+    taken = _existing(Course.course_code, {r.get("course_code") for r in chunk})
+
+    for r in chunk:
+        code = r.get("course_code", "")
+        name = r.get("course_name", "")
+        if not code or not name:
+            bad.append((r, "course_code and course_name are required"))
+            continue
+        if code in taken or code in seen:
+            bad.append((r, "Course already exists"))
+            continue
+        try:
+            credit = _opt_int(r.get("credit", "")) or 0
+            if credit < 0:
+                raise ValueError
+        except (ValueError, OverflowError):
+            bad.append((r, "credit must be a non-negative number"))
+            continue
+        try:
+            sem = _opt_int(r.get("sem", ""), SEMESTERS)
+        except (ValueError, OverflowError):
+            bad.append((r, "sem must be 1-8"))
+            continue
+        seen.add(code)
+        good.append({"course_code": code, "course_name": name,
+                     "credit": credit, "sem": sem})
+    return good, bad
+
+
+def _check_marks(chunk):
+    good, bad, seen = [], [], set()
+    students = _existing(Student.usn, {r.get("usn") for r in chunk})
+    courses = _existing(Course.course_code, {r.get("course_code") for r in chunk})
+
+    for r in chunk:
+        key = (r.get("usn", ""), r.get("course_code", ""))
+        if key[0] not in students:
+            bad.append((r, "USN not found"))
+            continue
+        if key[1] not in courses:
+            bad.append((r, "Course not found"))
+            continue
+        if key in seen:
+            bad.append((r, "duplicate usn + course_code in file"))
+            continue
+        try:
+            values = {f: int(float(r.get(f) or 0)) for f, _ in bulk.MARK_FIELDS}
+        except (ValueError, OverflowError):
+            bad.append((r, "marks must be numbers"))
+            continue
+        out = [f for f, hi in bulk.MARK_FIELDS if not 0 <= values[f] <= hi]
+        if out:
+            bad.append((r, f"{', '.join(out)} out of range"))
+            continue
+        seen.add(key)
+        good.append(dict(values, usn=key[0], course_code=key[1]))
+    return good, bad
+
+
+def _insert_students(rows):
+    db.session.execute(insert(Student), rows)
+
+
+def _insert_courses(rows):
+    db.session.execute(insert(Course), rows)
+
+
+KINDS = {
+    "students": (_check_students, _insert_students),
+    "courses": (_check_courses, _insert_courses),
+    "marks": (_check_marks, bulk.upsert_marks),
+}
+
+
+# ---------------------------------------------------
+# PIPELINE
+# ---------------------------------------------------
+def _write_rejects(path, bad, first_line, chunk):
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        if new_file:
+            writer.writerow(["row", "reason", "data"])
+        index = {id(r): n for n, r in enumerate(chunk)}
+        for r, reason in sorted(bad, key=lambda b: index[id(b[0])]):
+            data = "; ".join(
+                f"{k}={v}" for k, v in r.items() if k != MALFORMED
+            )
+            writer.writerow([first_line + index[id(r)], reason, data])
+
+
+def run_import(kind, path, chunk_size=CHUNK_SIZE, reject_path=None,
+               restart=False, progress=None):
+    """
+    Import ``path`` as ``kind`` and return the ImportRun row.
+
+    An unfinished run for the same (kind, file) is resumed unless
+    ``restart`` is set. ``progress`` is called with the run after each chunk.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"unknown import kind: {kind}")
+    check, write = KINDS[kind]
+    source = os.path.abspath(path)
+
+    run = None
+    if not restart:
+        run = (
+            ImportRun.query
+            .filter_by(kind=kind, source=source, status="running")
+            .order_by(ImportRun.id.desc())
+            .first()
+        )
+    if run is None:
+        run = ImportRun(
+            kind=kind, source=source, rows_done=0, inserted=0, rejected=0,
+            status="running",
+            reject_path=reject_path or f"{source}.rejects.csv",
+        )
+        db.session.add(run)
+        db.session.commit()
+        if os.path.exists(run.reject_path):
+            os.remove(run.reject_path)
+
+    rows = islice(read_rows(path), run.rows_done, None)
+    for chunk in chunked(rows, chunk_size):
+        first_line = run.rows_done + 1
+        bad = [(r, r[MALFORMED]) for r in chunk if MALFORMED in r]
+        good, checked_bad = check([r for r in chunk if MALFORMED not in r])
+        bad += checked_bad
+        if good:
+            write(good)
+        run.rows_done += len(chunk)
+        run.inserted += len(good)
+        run.rejected += len(bad)
+        db.session.commit()
+        # only after the commit: a chunk that fails is retried on resume
+        # and would otherwise log its rejects twice
+        if bad:
+            _write_rejects(run.reject_path, bad, first_line, chunk)
+        if progress:
+            progress(run)
+
+    run.status = "done"
+    db.session.commit()
+    if kind == "courses":
+        refdata.invalidate()
+    return run
+
+
+# ---------------------------------------------------
+# CLI:  flask import <students|courses|marks> FILE
+# ---------------------------------------------------
+@click.command("import")
+@click.argument("kind", type=click.Choice(sorted(KINDS)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--chunk-size", default=CHUNK_SIZE, show_default=True,
+              help="Rows per committed batch.")
+@click.option("--rejects", "reject_path", type=click.Path(dir_okay=False),
+              help="Reject file (default: FILE.rejects.csv).")
+@click.option("--restart", is_flag=True,
+              help="Start from the top instead of resuming.")
+def import_command(kind, path, chunk_size, reject_path, restart):
+    """Stream a CSV/XLSX file of students, courses or marks into the DB."""
+    run = run_import(
+        kind, path, chunk_size=chunk_size, reject_path=reject_path,
+        restart=restart,
+        progress=lambda r: click.echo(f"  {r.rows_done} rows...", err=True),
+    )
+    click.echo(f"{run.inserted} row(s) imported, {run.rejected} rejected.")
+    if run.rejected:
+        click.echo(f"Rejected rows written to {run.reject_path}")
@@ -0,0 +1,246 @@
+"""
+Per-request SQL and render instrumentation.
+
+SQLAlchemy cursor events time every statement; Flask signals time the
+request and template rendering. Each request's numbers are folded into
+per-endpoint totals kept in process and shown at /admin/metrics (HTML) and
+/metrics (Prometheus text format).
+
+The N+1 detector normalises each statement to its shape (whitespace and
+expanded IN lists collapsed) and flags a request that runs the same shape
+N_PLUS_ONE_THRESHOLD times or more.
+
+    DPMS_SLOW_QUERY_MS     statements slower than this are kept (default 50)
+    DPMS_METRICS_PUBLIC=1  serve /metrics without login (for scrapers)
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from flask import (
+    Blueprint, current_app, g, has_request_context, render_template, request,
+    redirect, url_for, Response, template_rendered, before_render_template,
+    request_started
+)
+from sqlalchemy import event
+
+N_PLUS_ONE_THRESHOLD = 5
+SLOW_QUERY_MS = float(os.environ.get("DPMS_SLOW_QUERY_MS") or 50)
+KEEP_SLOW = 50
+KEEP_N_PLUS_ONE = 50
+
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|:\w+)\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement):
+    shape = _SPACE.sub(" ", statement).strip()
+    return _IN_LIST.sub("(?...)", shape)
+
+
+class EndpointStats:
+    __slots__ = ("requests", "seconds", "queries", "db_seconds",
+                 "render_seconds", "max_queries", "n_plus_one")
+
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.max_queries = 0
+        self.n_plus_one = 0
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        self.slow = []                                   # (ms, endpoint, sql)
+        self.n_plus_one = deque(maxlen=KEEP_N_PLUS_ONE)  # (endpoint, count, sql)
+
+    def record(self, endpoint, seconds, queries, db_seconds, render_seconds,
+               slow, repeated):
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, EndpointStats())
+            stats.requests += 1
+            stats.seconds += seconds
+            stats.queries += queries
+            stats.db_seconds += db_seconds
+            stats.render_seconds += render_seconds
+            stats.max_queries = max(stats.max_queries, queries)
+
+            self.slow.extend((ms, endpoint, sql) for ms, sql in slow)
+            if len(self.slow) > KEEP_SLOW:
+                self.slow.sort(reverse=True)
+                del self.slow[KEEP_SLOW:]
+
+            if repeated:
+                stats.n_plus_one += 1
+                for shape, count in repeated:
+                    self.n_plus_one.append((endpoint, count, shape))
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {
+                name: {f: getattr(s, f) for f in EndpointStats.__slots__}
+                for name, s in self.endpoints.items()
+            }
+            return endpoints, sorted(self.slow, reverse=True), list(self.n_plus_one)
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+            self.slow.clear()
+            self.n_plus_one.clear()
+
+
+metrics = Metrics()
+
+
+# ---------------------------------------------------
+# HOOKS
+# ---------------------------------------------------
+def _state():
+    if not has_request_context():
+        return None
+    return g.get("_instr")
+
+
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    conn.info["_instr_start"] = time.perf_counter()
+
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("_instr_start", None)
+    state = _state()
+    if started is None or state is None:
+        return
+    elapsed = time.perf_counter() - started
+    state["queries"] += 1
+    state["db_seconds"] += elapsed
+    shape = statement_shape(statement)
+    state["shapes"][shape] += 1
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        state["slow"].append((elapsed * 1000, shape))
+
+
+def _request_started(sender, **extra):
+    g._instr = {
+        "start": time.perf_counter(),
+        "queries": 0,
+        "db_seconds": 0.0,
+        "render_seconds": 0.0,
+        "render_start": None,
+        "shapes": Counter(),
+        "slow": [],
+    }
+
+
+def _before_render(sender, template, context, **extra):
+    state = _state()
+    if state is not None:
+        state["render_start"] = time.perf_counter()
+
+
+def _rendered(sender, template, context, **extra):
+    state = _state()
+    if state is not None and state["render_start"] is not None:
+        state["render_seconds"] += time.perf_counter() - state["render_start"]
+        state["render_start"] = None
+
+
+def _teardown(exc):
+    state = g.pop("_instr", None)
+    if state is None:
+        return
+    endpoint = request.endpoint or "<unmatched>"
+    if endpoint == "static":
+        return
+
+    repeated = [
+        (shape, count) for shape, count in state["shapes"].items()
+        if count >= N_PLUS_ONE_THRESHOLD
+    ]
+    if repeated:
+        current_app.logger.warning(
+            "possible N+1 in %s: %s", endpoint,
+            "; ".join(f"{count}x {shape[:120]}" for shape, count in repeated)
+        )
+
+    metrics.record(
+        endpoint,
+        time.perf_counter() - state["start"],
+        state["queries"],
+        state["db_seconds"],
+        state["render_seconds"],
+        state["slow"],
+        repeated,
+    )
+
+
+# ---------------------------------------------------
+# VIEWS
+# ---------------------------------------------------
+bp = Blueprint("instrumentation", __name__)
+
+
+@bp.route("/admin/metrics")
+def admin_metrics():
+    endpoints, slow, n_plus_one = metrics.snapshot()
+    rows = sorted(endpoints.items(), key=lambda kv: -kv[1]["seconds"])
+    return render_template(
+        "admin_metrics.html",
+        rows=rows, slow=slow, n_plus_one=n_plus_one,
+        slow_ms=SLOW_QUERY_MS, threshold=N_PLUS_ONE_THRESHOLD
+    )
+
+
+@bp.route("/admin/metrics/reset", methods=["POST"])
+def reset_metrics():
+    metrics.reset()
+    return redirect(url_for("instrumentation.admin_metrics"))
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+@bp.route("/metrics")
+def prometheus():
+    endpoints, _, _ = metrics.snapshot()
+    series = [
+        ("dpms_requests_total", "counter", "Requests served", "requests"),
+        ("dpms_request_seconds_total", "counter", "Time spent in requests", "seconds"),
+        ("dpms_db_queries_total", "counter", "SQL statements executed", "queries"),
+        ("dpms_db_seconds_total", "counter", "Time spent in SQL", "db_seconds"),
+        ("dpms_render_seconds_total", "counter", "Time spent rendering templates",
+         "render_seconds"),
+        ("dpms_n_plus_one_total", "counter", "Requests flagged as N+1", "n_plus_one"),
+        ("dpms_db_queries_max", "gauge", "Most SQL statements in one request",
+         "max_queries"),
+    ]
+    lines = []
+    for name, kind, help_text, field in series:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for endpoint, stats in sorted(endpoints.items()):
+            lines.append(f'{name}{{endpoint="{_label(endpoint)}"}} {stats[field]}')
+    return Response("\n".join(lines) + "\n",
+                    mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app, db):
+    app.config.setdefault(
+        "METRICS_PUBLIC", os.environ.get("DPMS_METRICS_PUBLIC") == "1"
+    )
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", _before_cursor)
+        event.listen(db.engine, "after_cursor_execute", _after_cursor)
+    request_started.connect(_request_started, app)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    app.teardown_request(_teardown)
+    app.register_blueprint(bp)
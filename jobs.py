@@ -0,0 +1,315 @@
+"""
+In-process background jobs.
+
+Routes that would otherwise block a worker (supplementary assignment for a
+large red band, score recompute, imports, exports, ANALYZE / VACUUM) call
+``submit()`` and redirect to ``/jobs/<id>``. The job row is committed
+before it is handed to a thread pool, so anything still queued when the
+process stops is picked up again at the next start. While a handler runs,
+a heartbeat thread touches its row every HEARTBEAT seconds, so a job that
+reports no progress of its own still looks alive to other processes; jobs
+left "running" by a crashed process are re-queued once their row has not
+been touched for STALE_AFTER seconds.
+
+Each job kind has its own concurrency limit; extra jobs of that kind wait
+in a per-kind queue instead of tying up pool threads. The limits hold
+within one process: with several workers each may run its own jobs of a
+kind at the same time (the atomic claim only stops one job running
+twice). A handler that fails with ``database is locked`` is rolled back
+and retried with backoff.
+
+    DPMS_JOB_WORKERS   pool size (default 4)
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import Blueprint, jsonify, render_template, request
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+
+from models import db, Job
+import bulk
+import export
+import importer
+import maintenance
+import scoring
+
+MAX_WORKERS = int(os.environ.get("DPMS_JOB_WORKERS") or 4)
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 0.5          # seconds, doubled on each retry
+STALE_AFTER = 300          # seconds without a progress update or heartbeat
+HEARTBEAT = 30             # seconds between heartbeats of a running job
+
+# kind -> (handler, concurrency limit)
+HANDLERS = {}
+
+# where the job page links to once a job of that kind has finished
+DONE_URLS = {
+    "assign_supplementary": "/supplementary",
+    "recompute_scores": "/band-analysis",
+    "import": "/import",
+    "export": "/exports",
+}
+
+
+def handler(kind, limit=1):
+    """Register ``fn(job, **params)`` as the handler for ``kind``."""
+    def decorator(fn):
+        HANDLERS[kind] = (fn, limit)
+        return fn
+    return decorator
+
+
+def _is_locked(exc):
+    return "locked" in str(getattr(exc, "orig", exc)).lower()
+
+
+class JobContext:
+    """Handed to handlers so they can report progress."""
+
+    def __init__(self, job_id, attempt):
+        self.id = job_id
+        self.attempt = attempt
+
+    def progress(self, done, total=None, message=None):
+        """Record progress. Commits the handler's session with it."""
+        values = {"progress": done, "updated_at": datetime.now()}
+        if total is not None:
+            values["total"] = total
+        if message is not None:
+            values["message"] = message
+        db.session.execute(update(Job).where(Job.id == self.id).values(**values))
+        db.session.commit()
+
+
+class Runner:
+    def __init__(self):
+        self.app = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self._running = defaultdict(int)
+        self._waiting = defaultdict(deque)
+
+    def init_app(self, app):
+        self.app = app
+        self._pool = ThreadPoolExecutor(MAX_WORKERS,
+                                        thread_name_prefix="dpms-job")
+
+    def dispatch(self, job_id, kind):
+        limit = HANDLERS[kind][1]
+        with self._lock:
+            if self._running[kind] >= limit:
+                self._waiting[kind].append(job_id)
+                return
+            self._running[kind] += 1
+        self._pool.submit(self._run, job_id, kind)
+
+    def _next(self, kind):
+        with self._lock:
+            if self._waiting[kind]:
+                job_id = self._waiting[kind].popleft()
+            else:
+                self._running[kind] -= 1
+                return
+        self._pool.submit(self._run, job_id, kind)
+
+    def _run(self, job_id, kind):
+        try:
+            with self.app.app_context():
+                self._execute(job_id, kind)
+        except Exception:
+            self.app.logger.exception("job %s (%s) crashed", job_id, kind)
+        finally:
+            self._next(kind)
+
+    def _set(self, job_id, **values):
+        values["updated_at"] = datetime.now()
+        db.session.execute(update(Job).where(Job.id == job_id).values(**values))
+        db.session.commit()
+
+    def _heartbeat(self, job_id, stop):
+        """Touch the job's row until ``stop`` is set."""
+        with self.app.app_context():
+            while not stop.wait(HEARTBEAT):
+                try:
+                    db.session.execute(
+                        update(Job)
+                        .where(Job.id == job_id, Job.status == "running")
+                        .values(updated_at=datetime.now())
+                    )
+                    db.session.commit()
+                except OperationalError:
+                    # the handler holds the write lock; try the next beat
+                    db.session.rollback()
+            db.session.remove()
+
+    def _execute(self, job_id, kind):
+        # claim it; another process may have picked it up at startup too
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "queued")
+            .values(status="running", updated_at=datetime.now())
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return
+
+        job = db.session.get(Job, job_id)
+        params = json.loads(job.params or "{}")
+        attempts = job.attempts
+        fn = HANDLERS[kind][0]
+
+        stop = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(job_id, stop),
+                                name=f"dpms-job-{job_id}-heartbeat", daemon=True)
+        beat.start()
+        try:
+            self._attempt(job_id, fn, params, attempts)
+        finally:
+            stop.set()
+            beat.join()
+
+    def _attempt(self, job_id, fn, params, attempts):
+        while True:
+            attempts += 1
+            self._set(job_id, attempts=attempts)
+            try:
+                result = fn(JobContext(job_id, attempts), **params)
+                db.session.commit()
+            except OperationalError as exc:
+                db.session.rollback()
+                if _is_locked(exc) and attempts < MAX_ATTEMPTS:
+                    time.sleep(RETRY_DELAY * 2 ** (attempts - 1))
+                    continue
+                self._set(job_id, status="failed", error=str(exc)[:500])
+                raise
+            except Exception as exc:
+                db.session.rollback()
+                self._set(job_id, status="failed", error=str(exc)[:500])
+                raise
+            self._set(job_id, status="done", result=json.dumps(result))
+            return
+
+    def resume(self):
+        """Re-queue stale running jobs and dispatch everything queued."""
+        cutoff = datetime.now() - timedelta(seconds=STALE_AFTER)
+        db.session.execute(
+            update(Job)
+            .where(Job.status == "running", Job.updated_at < cutoff)
+            .values(status="queued")
+        )
+        db.session.commit()
+        queued = (
+            db.session.query(Job.id, Job.kind)
+            .filter(Job.status == "queued", Job.kind.in_(HANDLERS))
+            .order_by(Job.id)
+            .all()
+        )
+        for job_id, kind in queued:
+            self.dispatch(job_id, kind)
+
+
+runner = Runner()
+
+
+def submit(kind, /, **params):
+    """Queue a job (commits) and return its row."""
+    if kind not in HANDLERS:
+        raise ValueError(f"unknown job kind: {kind}")
+    job = Job(kind=kind, params=json.dumps(params), status="queued")
+    db.session.add(job)
+    db.session.commit()
+    runner.dispatch(job.id, kind)
+    return job
+
+
+# ---------------------------------------------------
+# HANDLERS
+# each returns a JSON-able result shown on the job page
+# ---------------------------------------------------
+@handler("assign_supplementary", limit=1)
+def _assign_supplementary(job, teacher_id, course_codes=None, sem=None):
+    created, skipped = bulk.assign_supplementary(
+        teacher_id, course_codes=course_codes, sem=sem
+    )
+    return {"created": created, "skipped": skipped}
+
+
+@handler("recompute_scores", limit=1)
+def _recompute_scores(job):
+    return {"changed": scoring.recompute_all()}
+
+
+@handler("import", limit=2)
+def _import(job, kind, path):
+    # a retry resumes after the last committed chunk
+    run = importer.run_import(
+        kind, path, restart=job.attempt == 1,
+        progress=lambda r: job.progress(
+            r.rows_done, message=f"{r.inserted} imported, {r.rejected} rejected"
+        ),
+    )
+    return {"run_id": run.id, "inserted": run.inserted, "rejected": run.rejected}
+
+
+@handler("export", limit=2)
+def _export(job, run_id):
+    run = export.run_export(run_id)
+    return {"run_id": run.id, "rows": run.rows}
+
+
+@handler("optimize", limit=1)
+def _optimize(job, vacuum=None):
+    return maintenance.optimize(vacuum)
+
+
+# ---------------------------------------------------
+# VIEWS
+# ---------------------------------------------------
+bp = Blueprint("jobs", __name__)
+
+
+def job_dict(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "progress": job.progress,
+        "total": job.total,
+        "message": job.message,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(timespec="seconds"),
+        "updated_at": job.updated_at.isoformat(timespec="seconds"),
+    }
+
+
+@bp.route("/jobs")
+def job_list():
+    jobs = Job.query.order_by(Job.id.desc()).limit(50).all()
+    return render_template("jobs.html", jobs=jobs)
+
+
+@bp.route("/jobs/<int:job_id>")
+def job_status(job_id):
+    job = Job.query.get_or_404(job_id)
+    if (request.args.get("format") == "json"
+            or request.accept_mimetypes.best == "application/json"):
+        return jsonify(job_dict(job))
+    return render_template(
+        "job.html", job=job, info=job_dict(job), done_url=DONE_URLS.get(job.kind)
+    )
+
+
+def init_app(app):
+    """Start the pool and pick up queued work. Call after migrations."""
+    runner.init_app(app)
+    app.register_blueprint(bp)
+    with app.app_context():
+        runner.resume()
@@ -0,0 +1,300 @@
+"""
+Bulk deletes, orphan cleanup and database upkeep.
+
+Students, courses and teachers are deleted with one set-based DELETE per
+dependent table, children first, inside the caller's transaction: a
+student takes its marks and supplementaries with it; a course its marks,
+supplementaries and Teaches rows; a teacher its Teaches rows and the
+supplementaries assigned to them. The stats / rollup / search / changelog
+triggers see ordinary deletes, so derived data stays in step.
+
+SQLite connections run with ``PRAGMA foreign_keys = ON`` (see config.py),
+so a delete that skips a child is refused instead of leaving orphans.
+Rows orphaned before that was switched on are listed by ``orphans()``;
+``delete_orphans()`` removes the kinds that a cascade would have removed.
+Marks and Teaches rows naming a course missing from the catalogue are only
+reported: they are the department's records, and the fix is to add the
+course.
+
+After a large delete ``schedule_optimize()`` queues an ``optimize`` job
+(see jobs.py): ANALYZE so the planner sees the new row counts, and VACUUM
+once free pages pass VACUUM_FREE_SHARE of the file.
+
+    flask maint delete-students --sem 8 [--section A] [USN ...]
+    flask maint delete-courses [--sem N] [CODE ...]
+    flask maint delete-teachers TID ...
+    flask maint orphans [--fix]
+    flask maint optimize [--vacuum]
+"""
+import click
+from sqlalchemy import text
+
+from models import db, Job
+
+# (name, child table, child column, parent table, parent column, removable)
+RELATIONS = (
+    ("marks without student", "marks", "usn", "student", "usn", True),
+    ("supplementary without student", "supplementary", "usn", "student", "usn", True),
+    ("supplementary without course", "supplementary", "course_code",
+     "course", "course_code", True),
+    ("supplementary without teacher", "supplementary", "teacher_id",
+     "teacher", "tid", True),
+    ("teaches without teacher", "teaches", "tid", "teacher", "tid", True),
+    ("marks without course", "marks", "course_code", "course", "course_code", False),
+    ("teaches without course", "teaches", "course_code", "course", "course_code", False),
+)
+
+# children of each parent table, deleted before it
+CASCADES = {
+    "student": (("supplementary", "usn"), ("marks", "usn")),
+    "course": (("supplementary", "course_code"), ("marks", "course_code"),
+               ("teaches", "course_code")),
+    "teacher": (("supplementary", "teacher_id"), ("teaches", "tid")),
+}
+
+# rows deleted in one go before an optimize job is queued
+OPTIMIZE_AFTER = 500
+VACUUM_FREE_SHARE = 0.2
+
+
+# ---------------------------------------------------
+# CASCADING DELETES
+# ---------------------------------------------------
+def _keys(values, prefix):
+    """``IN (:k0, :k1, ...)`` placeholder list and its parameters."""
+    params = {f"{prefix}{i}": v for i, v in enumerate(values)}
+    return ", ".join(f":{p}" for p in params), params
+
+
+def _cascade(table, key, selection, params):
+    """
+    Delete the ``table`` rows whose ``key`` is in ``selection`` (a SELECT
+    of keys) and their children. Returns {table: rows deleted}.
+    """
+    # children first, while ``selection`` still finds their parents
+    counts = {}
+    for child, column in CASCADES[table]:
+        counts[child] = db.session.execute(text(
+            f"DELETE FROM {child} WHERE {column} IN ({selection})"
+        ), params).rowcount
+    counts[table] = db.session.execute(text(
+        f"DELETE FROM {table} WHERE {key} IN ({selection})"
+    ), params).rowcount
+    return counts
+
+
+def delete_students(usns=None, sem=None, section=None):
+    """
+    Delete students by USN and / or class (e.g. a graduated semester)
+    with their marks and supplementaries. Caller commits.
+    """
+    if not usns and sem is None:
+        raise ValueError("usns or sem is required")
+    where, params = [], {}
+    if usns:
+        keys, params = _keys(usns, "u")
+        where.append(f"usn IN ({keys})")
+    if sem is not None:
+        where.append("sem = :sem")
+        params["sem"] = sem
+    if section:
+        where.append("section = :section")
+        params["section"] = section
+    return _cascade(
+        "student", "usn",
+        f"SELECT usn FROM student WHERE {' AND '.join(where)}", params
+    )
+
+
+def delete_courses(codes=None, sem=None):
+    """
+    Delete courses by code and / or semester with their marks,
+    supplementaries and Teaches rows. Caller commits.
+    """
+    if not codes and sem is None:
+        raise ValueError("codes or sem is required")
+    where, params = [], {}
+    if codes:
+        keys, params = _keys(codes, "c")
+        where.append(f"course_code IN ({keys})")
+    if sem is not None:
+        where.append("sem = :sem")
+        params["sem"] = sem
+    return _cascade(
+        "course", "course_code",
+        f"SELECT course_code FROM course WHERE {' AND '.join(where)}", params
+    )
+
+
+def delete_teachers(tids):
+    """
+    Delete teachers with their Teaches rows and the supplementaries
+    assigned to them. Caller commits.
+    """
+    if not tids:
+        raise ValueError("tids is required")
+    keys, params = _keys([str(t) for t in tids], "t")
+    return _cascade(
+        "teacher", "tid", f"SELECT tid FROM teacher WHERE tid IN ({keys})", params
+    )
+
+
+# ---------------------------------------------------
+# ORPHANS
+# ---------------------------------------------------
+def _orphaned(child, column, parent, parent_column):
+    return (f"FROM {child} WHERE {column} IS NOT NULL AND NOT EXISTS "
+            f"(SELECT 1 FROM {parent} p WHERE p.{parent_column} = {child}.{column})")
+
+
+def orphans():
+    """[(name, count, removable)] for every relation, one query each."""
+    out = []
+    for name, child, column, parent, parent_column, removable in RELATIONS:
+        n = db.session.execute(text(
+            f"SELECT COUNT(*) {_orphaned(child, column, parent, parent_column)}"
+        )).scalar()
+        out.append((name, n, removable))
+    return out
+
+
+def delete_orphans():
+    """Remove the removable orphans. Returns {name: rows}. Caller commits."""
+    return {
+        name: db.session.execute(text(
+            f"DELETE {_orphaned(child, column, parent, parent_column)}"
+        )).rowcount
+        for name, child, column, parent, parent_column, removable in RELATIONS
+        if removable
+    }
+
+
+# ---------------------------------------------------
+# ANALYZE / VACUUM
+# ---------------------------------------------------
+def free_share():
+    """Share of the SQLite file sitting in free pages."""
+    pages = db.session.execute(text("PRAGMA page_count")).scalar()
+    free = db.session.execute(text("PRAGMA freelist_count")).scalar()
+    return free / pages if pages else 0.0
+
+
+def optimize(vacuum=None):
+    """
+    ANALYZE, then VACUUM when asked or (``vacuum=None``) when free pages
+    pass VACUUM_FREE_SHARE. Returns what was done.
+    """
+    if db.engine.dialect.name != "sqlite":
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+        return {"analyzed": True, "vacuumed": False}
+
+    share = free_share()
+    # main only: the archive (see archive.py) is attached read-only
+    db.session.execute(text("ANALYZE main"))
+    db.session.commit()
+    if vacuum is None:
+        vacuum = share >= VACUUM_FREE_SHARE
+    if vacuum:
+        # VACUUM cannot run inside a transaction
+        with db.engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(
+                text("VACUUM")
+            )
+    return {"analyzed": True, "vacuumed": bool(vacuum),
+            "free_share": round(share, 3)}
+
+
+def schedule_optimize(deleted):
+    """
+    Queue an optimize job after ``deleted`` rows went, unless one is
+    already waiting. Returns the job or None.
+    """
+    import jobs   # jobs imports this module for its handler
+
+    if deleted < OPTIMIZE_AFTER:
+        return None
+    pending = Job.query.filter(
+        Job.kind == "optimize", Job.status.in_(("queued", "running"))
+    ).first()
+    return pending or jobs.submit("optimize")
+
+
+def summary(counts):
+    """'student: 3, marks: 12' for flash messages and the CLI."""
+    return ", ".join(f"{table}: {n}" for table, n in counts.items() if n) or "nothing"
+
+
+# ---------------------------------------------------
+# CLI:  flask maint ...
+# ---------------------------------------------------
+@click.group("maint")
+def maint_cli():
+    """Bulk deletes, orphan cleanup, ANALYZE / VACUUM."""
+
+
+def _commit(counts, done="Deleted"):
+    db.session.commit()
+    click.echo(f"{done} {summary(counts)}.")
+    # a CLI process exits before a queued job would run; optimize inline
+    if sum(counts.values()) >= OPTIMIZE_AFTER:
+        optimize()
+        click.echo("ANALYZE done.")
+
+
+@maint_cli.command("delete-students")
+@click.argument("usns", nargs=-1)
+@click.option("--sem", type=int, help="Every student of this semester.")
+@click.option("--section", help="Only this section of --sem.")
+@click.confirmation_option(prompt="Delete these students with their marks?")
+def delete_students_command(usns, sem, section):
+    """Delete students (by USN or class) with their marks and supplementaries."""
+    if not usns and sem is None:
+        raise click.UsageError("give USNs or --sem")
+    _commit(delete_students(list(usns), sem, section))
+
+
+@maint_cli.command("delete-courses")
+@click.argument("codes", nargs=-1)
+@click.option("--sem", type=int, help="Every course of this semester.")
+@click.confirmation_option(prompt="Delete these courses with their marks?")
+def delete_courses_command(codes, sem):
+    """Delete courses with their marks, supplementaries and Teaches rows."""
+    if not codes and sem is None:
+        raise click.UsageError("give course codes or --sem")
+    _commit(delete_courses(list(codes), sem))
+    from refdata import refdata
+    refdata.invalidate()
+
+
+@maint_cli.command("delete-teachers")
+@click.argument("tids", nargs=-1, required=True)
+@click.confirmation_option(prompt="Delete these teachers?")
+def delete_teachers_command(tids):
+    """Delete teachers with their Teaches rows and supplementaries."""
+    _commit(delete_teachers(list(tids)))
+    from refdata import refdata
+    refdata.invalidate()
+
+
+@maint_cli.command("orphans")
+@click.option("--fix", is_flag=True, help="Delete the removable orphans.")
+def orphans_command(fix):
+    """List rows pointing at a missing student, course or teacher."""
+    found = orphans()
+    for name, n, removable in found:
+        note = "" if removable else "  (report only: add the course)"
+        click.echo(f"{n:8d}  {name}{note}")
+    if not fix:
+        return
+    _commit(delete_orphans(), done="Removed orphans:")
+
+
+@maint_cli.command("optimize")
+@click.option("--vacuum/--no-vacuum", default=None,
+              help="Force or skip VACUUM (default: when free pages pass "
+                   f"{VACUUM_FREE_SHARE:.0%}).")
+def optimize_command(vacuum):
+    """ANALYZE, and VACUUM when the file has grown sparse."""
+    done = optimize(vacuum)
+    click.echo(f"ANALYZE done; VACUUM {'done' if done['vacuumed'] else 'skipped'}.")
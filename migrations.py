@@ -0,0 +1,249 @@
+"""
+Versioned schema migrations.
+
+``db.create_all()`` only creates missing tables; it never adds triggers or
+indexes to tables that already exist (our instance/dpms.db predates most of
+them). Each migration below runs once, in order, in its own transaction,
+and bumps ``schema_version``. All DDL is idempotent so a database created
+fresh by ``create_all()`` can run the full list safely.
+
+The development server runs ``setup()`` at startup; production workers
+(wsgi.py) only check the version and refuse to start if it is behind, so
+run ``flask --app app db upgrade`` on deploy.
+
+    flask db upgrade        apply pending migrations
+    flask db version        show current / latest version
+    flask db check-plans    EXPLAIN QUERY PLAN regression check
+"""
+import click
+from sqlalchemy import inspect, select, text
+
+from models import db, Marks
+import bulk
+import stats
+import scoring
+import cache
+import changelog
+import search
+import rollup
+
+
+def _stats_triggers():
+    stats.install()
+
+
+def _marks_log():
+    changelog.add_updated_by()
+    changelog.install_triggers()
+
+
+def _search_index():
+    search.install()
+    search.rebuild()
+
+
+def _student_rollup():
+    rollup.install_triggers()
+    rollup.rebuild()
+
+
+def _score_triggers():
+    # replaces the hand-installed calc_category triggers and fills in any
+    # rows written while triggers.sql was empty
+    scoring.install_triggers()
+    scoring.recompute_all()
+
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_marks_course_category ON marks (course_code, category)",
+    "CREATE INDEX IF NOT EXISTS ix_marks_category ON marks (category)",
+    "CREATE INDEX IF NOT EXISTS ix_student_sem_section ON student (sem, section)",
+    "CREATE INDEX IF NOT EXISTS ix_course_sem ON course (sem)",
+    "CREATE INDEX IF NOT EXISTS ix_teaches_course_code ON teaches (course_code)",
+    "CREATE INDEX IF NOT EXISTS ix_supplementary_teacher_id ON supplementary (teacher_id)",
+    "CREATE INDEX IF NOT EXISTS ix_supplementary_course_code ON supplementary (course_code)",
+]
+
+
+# (version, description, list of SQL statements or a callable)
+MIGRATIONS = [
+    (1, "dashboard stats triggers", _stats_triggers),
+    (2, "secondary indexes on hot filter / join columns", INDEXES),
+    (3, "calc_category triggers from scoring.py", _score_triggers),
+    (4, "table_version counters for cached reports", cache.install),
+    (5, "marks change log triggers", _marks_log),
+    (6, "FTS5 search index over students, teachers, courses", _search_index),
+    (7, "per-student rollup triggers", _student_rollup),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version():
+    db.session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"
+    ))
+    version = db.session.execute(
+        text("SELECT MAX(version) FROM schema_version")
+    ).scalar()
+    return version or 0
+
+
+def upgrade(echo=None):
+    """Apply every pending migration. Returns the list of versions applied."""
+    applied = []
+    version = current_version()
+    db.session.commit()
+
+    for number, description, steps in MIGRATIONS:
+        if number <= version:
+            continue
+        if echo:
+            echo(f"Applying {number}: {description}")
+        try:
+            if callable(steps):
+                steps()
+            else:
+                for sql in steps:
+                    db.session.execute(text(sql))
+            db.session.execute(
+                text("INSERT INTO schema_version (version) VALUES (:v)"),
+                {"v": number}
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        applied.append(number)
+    return applied
+
+
+def setup(echo=None):
+    """Create missing tables, then apply pending migrations."""
+    db.create_all()
+    return upgrade(echo=echo)
+
+
+def pending_count():
+    """Number of migrations not yet applied. Read-only: no DDL."""
+    if not inspect(db.engine).has_table("schema_version"):
+        return len(MIGRATIONS)
+    version = db.session.execute(
+        text("SELECT MAX(version) FROM schema_version")
+    ).scalar() or 0
+    return sum(1 for number, _, _ in MIGRATIONS if number > version)
+
+
+def require_current():
+    """Refuse to start a worker against a database that is behind."""
+    pending = pending_count()
+    if pending:
+        raise RuntimeError(
+            f"database schema is {pending} migration(s) behind; "
+            "run 'flask --app app db upgrade' first"
+        )
+
+
+# ---------------------------------------------------
+# EXPLAIN QUERY PLAN regression check
+# ---------------------------------------------------
+def _filters(**given):
+    """A listing filter dict (see app.listing_filters / api.filters)."""
+    keys = ("usn", "sem", "section", "course", "teacher", "band")
+    return {key: given.get(key) for key in keys}
+
+
+def plan_checks():
+    """
+    [(name, statement, indexes the plan must use one of)] for the hot
+    queries, built by the same helpers the routes and jobs run.
+    """
+    # imported here: app imports this module at load time
+    import api
+    import app
+
+    def red_band(**scope):
+        return select(Marks.usn, Marks.course_code).where(
+            bulk.red_band_filter(**scope)
+        )
+
+    return [
+        ("add_supplementary red band for a course",
+         red_band(course_codes=["X"]), ("ix_marks_course_category",)),
+        ("add_supplementary red band for a semester",
+         red_band(sem=5), ("ix_course_sem",)),
+        # once ANALYZE has run the planner may skip-scan the course index
+        # instead, which also saves the sort
+        ("red report across courses",
+         app.red_band_query(),
+         ("ix_marks_category", "ix_marks_course_category")),
+        ("marks-bulk section roster",
+         app.marks_bulk_query(5, "A", "X"), ("ix_student_sem_section",)),
+        ("supplementary by teacher",
+         api.supplementary_query(_filters(teacher="T1")),
+         ("ix_supplementary_teacher_id",)),
+        ("teaches of a course",
+         api.teaches_query(_filters(course="X")), ("ix_teaches_course_code",)),
+        # walks teacher in tid order for keyset pagination, probing
+        # teaches by its primary key
+        ("teachers listing by course",
+         app.teachers_query(_filters(course="X")),
+         ("sqlite_autoindex_teaches_1",)),
+        ("semester / section ranking",
+         rollup.ranking_query(5, "A"), ("ix_student_rollup_rank",)),
+    ]
+
+
+def check_plans():
+    """Return [(name, ok, plan_lines)] for every plan_checks() entry."""
+    dialect = db.engine.dialect
+    results = []
+    for name, query, indexes in plan_checks():
+        stmt = getattr(query, "statement", query)
+        sql = stmt.compile(dialect=dialect,
+                           compile_kwargs={"literal_binds": True})
+        # literal SQL, so a ':' inside a value is not read as a bind
+        rows = db.session.connection().exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {sql}"
+        )
+        plan = [row[-1] for row in rows]
+        # a SEARCH, not a full scan that happens to walk the index
+        ok = any(line.startswith("SEARCH") and f"INDEX {index} " in line
+                 for line in plan for index in indexes)
+        results.append((name, ok, plan))
+    return results
+
+
+# ---------------------------------------------------
+# CLI
+# ---------------------------------------------------
+@click.group("db")
+def db_cli():
+    """Schema migrations and query plan checks."""
+
+
+@db_cli.command("upgrade")
+def upgrade_command():
+    """Create missing tables and apply pending schema migrations."""
+    applied = setup(echo=click.echo)
+    if not applied:
+        click.echo(f"Schema is up to date (version {current_version()}).")
+
+
+@db_cli.command("version")
+def version_command():
+    """Show the schema version."""
+    click.echo(f"current: {current_version()}  latest: {LATEST}")
+
+
+@db_cli.command("check-plans")
+def check_plans_command():
+    """Fail if a hot query no longer uses its index."""
+    failed = 0
+    for name, ok, plan in check_plans():
+        click.echo(f"[{'ok' if ok else 'FAIL'}] {name}")
+        for line in plan:
+            click.echo(f"       {line}")
+        failed += not ok
+    if failed:
+        raise SystemExit(1)
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
@@ -5,6 +7,9 @@ db = SQLAlchemy()
 
 class Student(db.Model):
     __tablename__ = "student"
+    __table_args__ = (
+        db.Index("ix_student_sem_section", "sem", "section"),
+    )
 
     usn = db.Column(db.String, primary_key=True)
     student_name = db.Column(db.String, nullable=False)
@@ -21,6 +26,9 @@ class Teacher(db.Model):
 
 class Course(db.Model):
     __tablename__ = "course"
+    __table_args__ = (
+        db.Index("ix_course_sem", "sem"),
+    )
 
     course_code = db.Column(db.String, primary_key=True)
     credit = db.Column(db.Integer)
@@ -30,6 +38,9 @@ class Course(db.Model):
 
 class Teaches(db.Model):
     __tablename__ = "teaches"
+    __table_args__ = (
+        db.Index("ix_teaches_course_code", "course_code"),
+    )
 
     tid = db.Column(
         db.String,
@@ -52,6 +63,11 @@ class Teaches(db.Model):
 
 class Marks(db.Model):
     __tablename__ = "marks"
+    __table_args__ = (
+        db.Index("ix_marks_course_category", "course_code", "category"),
+        db.Index("ix_marks_category", "category"),
+    )
+
     usn = db.Column(db.String, db.ForeignKey("student.usn"), primary_key=True)
     course_code = db.Column(db.String, db.ForeignKey("course.course_code"), primary_key=True)
 
@@ -62,10 +78,16 @@ class Marks(db.Model):
 
     total_score = db.Column(db.Integer)
     category = db.Column(db.String)
+    # tid of the teacher who last wrote the row; copied into marks_log
+    updated_by = db.Column(db.String)
 
 
 class Supplementary(db.Model):
     __tablename__ = "supplementary"
+    __table_args__ = (
+        db.Index("ix_supplementary_teacher_id", "teacher_id"),
+        db.Index("ix_supplementary_course_code", "course_code"),
+    )
 
     usn = db.Column(
         db.String,
@@ -86,3 +108,146 @@ class Supplementary(db.Model):
     student = db.relationship("Student", backref="supplementaries")
     course = db.relationship("Course", backref="supplementaries")
     teacher = db.relationship("Teacher", backref="supplementaries")
+
+
+class DashboardStats(db.Model):
+    __tablename__ = "dashboard_stats"
+
+    # single row (id = 1), kept current by the stats_* triggers in stats.py
+    id = db.Column(db.Integer, primary_key=True)
+    total_students = db.Column(db.Integer, nullable=False, default=0)
+    total_teachers = db.Column(db.Integer, nullable=False, default=0)
+    marks_count = db.Column(db.Integer, nullable=False, default=0)
+    scored_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    green = db.Column(db.Integer, nullable=False, default=0)
+    yellow = db.Column(db.Integer, nullable=False, default=0)
+    red = db.Column(db.Integer, nullable=False, default=0)
+    supp_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ImportRun(db.Model):
+    __tablename__ = "import_run"
+
+    # one row per (kind, source) load; rows_done is committed together with
+    # each chunk so an interrupted load resumes after the last good chunk
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String, nullable=False)
+    source = db.Column(db.String, nullable=False)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    inserted = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String, nullable=False, default="running")
+    reject_path = db.Column(db.String)
+
+
+class TableVersion(db.Model):
+    __tablename__ = "table_version"
+
+    # bumped by the version_* triggers (see cache.py) on every write to the
+    # named table; cached results are keyed on it
+    name = db.Column(db.String, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ExportRun(db.Model):
+    __tablename__ = "export_run"
+
+    # one row per marks sheet export; the file is written under
+    # instance/exports by a background worker (see export.py)
+    id = db.Column(db.Integer, primary_key=True)
+    fmt = db.Column(db.String, nullable=False, default="csv")
+    sem = db.Column(db.Integer)
+    section = db.Column(db.String)
+    course_code = db.Column(db.String)
+    status = db.Column(db.String, nullable=False, default="queued")
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    path = db.Column(db.String)
+    error = db.Column(db.String)
+
+
+class Job(db.Model):
+    __tablename__ = "job"
+    __table_args__ = (
+        db.Index("ix_job_status", "status"),
+    )
+
+    # background work queued by the web routes (see jobs.py); params and
+    # result are JSON text so queued jobs survive a restart
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String, nullable=False)
+    params = db.Column(db.Text, nullable=False, default="{}")
+    status = db.Column(db.String, nullable=False, default="queued")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    message = db.Column(db.String)
+    result = db.Column(db.Text)
+    error = db.Column(db.String)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+
+class WebSession(db.Model):
+    __tablename__ = "web_session"
+    __table_args__ = (
+        db.Index("ix_web_session_expires_at", "expires_at"),
+    )
+
+    # server-side login sessions (see sessions.py); the cookie only carries
+    # the random sid
+    sid = db.Column(db.String, primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.Float, nullable=False)
+
+
+class MarksLog(db.Model):
+    __tablename__ = "marks_log"
+    __table_args__ = (
+        db.Index("ix_marks_log_usn_course", "usn", "course_code"),
+        {"sqlite_autoincrement": True},
+    )
+
+    # append-only, written by the marks_log_* triggers (see changelog.py);
+    # AUTOINCREMENT so seq only ever grows, even after rows are pruned
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    op = db.Column(db.String(1), nullable=False)       # I / U / D
+    usn = db.Column(db.String, nullable=False)
+    course_code = db.Column(db.String, nullable=False)
+    old_ia1 = db.Column(db.Integer)
+    old_ia2 = db.Column(db.Integer)
+    old_ia3 = db.Column(db.Integer)
+    old_assignment = db.Column(db.Integer)
+    old_total = db.Column(db.Integer)
+    old_category = db.Column(db.String)
+    new_ia1 = db.Column(db.Integer)
+    new_ia2 = db.Column(db.Integer)
+    new_ia3 = db.Column(db.Integer)
+    new_assignment = db.Column(db.Integer)
+    new_total = db.Column(db.Integer)
+    new_category = db.Column(db.String)
+    tid = db.Column(db.String)
+    changed_at = db.Column(db.DateTime, nullable=False,
+                           server_default=db.func.current_timestamp())
+
+
+class StudentRollup(db.Model):
+    __tablename__ = "student_rollup"
+    __table_args__ = (
+        db.Index("ix_student_rollup_rank", "sem", "section", "weighted_avg"),
+    )
+
+    # one row per student, refreshed by the rollup_* triggers (see
+    # rollup.py) whenever that student's marks or supplementaries change
+    usn = db.Column(db.String, primary_key=True)
+    sem = db.Column(db.Integer)
+    section = db.Column(db.String)
+    courses = db.Column(db.Integer, nullable=False, default=0)
+    scored = db.Column(db.Integer, nullable=False, default=0)
+    credits = db.Column(db.Integer, nullable=False, default=0)
+    weighted_sum = db.Column(db.Integer, nullable=False, default=0)
+    weighted_avg = db.Column(db.Float)      # NULL until a course is scored
+    green = db.Column(db.Integer, nullable=False, default=0)
+    yellow = db.Column(db.Integer, nullable=False, default=0)
+    red = db.Column(db.Integer, nullable=False, default=0)
+    supplementary = db.Column(db.Integer, nullable=False, default=0)
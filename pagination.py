@@ -0,0 +1,102 @@
+"""
+Keyset (seek) pagination.
+
+Pages are fetched with ``WHERE key > :cursor ORDER BY key LIMIT n`` on the
+natural key, so page 500 costs the same as page 1. Cursors are opaque
+url-safe strings carrying the key values of the first/last row shown.
+"""
+import base64
+import json
+
+from flask import request, url_for
+from sqlalchemy import tuple_
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return tuple(values) if isinstance(values, list) else None
+
+
+def per_page_arg():
+    n = request.args.get("per_page", DEFAULT_PER_PAGE, type=int)
+    return max(1, min(n or DEFAULT_PER_PAGE, MAX_PER_PAGE))
+
+
+class Page:
+    def __init__(self, items, next_cursor, prev_cursor, per_page):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.per_page = per_page
+
+    def _url(self, **cursor):
+        args = request.args.to_dict()
+        args.pop("after", None)
+        args.pop("before", None)
+        args.update(cursor)
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    @property
+    def next_url(self):
+        return self._url(after=self.next_cursor) if self.next_cursor else None
+
+    @property
+    def prev_url(self):
+        return self._url(before=self.prev_cursor) if self.prev_cursor else None
+
+
+def _key_expr(keys):
+    return keys[0] if len(keys) == 1 else tuple_(*keys)
+
+
+def paginate(query, keys, key_of, after=None, before=None, per_page=None):
+    """
+    Seek-paginate ``query`` on the ordered ``keys`` columns.
+
+    ``key_of(row)`` returns the key tuple of a result row. ``after`` /
+    ``before`` are cursors from a previous Page (``before`` wins if both are
+    given). Fetches one extra row to know whether there is another page.
+    """
+    per_page = per_page or DEFAULT_PER_PAGE
+    expr = _key_expr(keys)
+    after_key, before_key = decode_cursor(after), decode_cursor(before)
+
+    def bind(key):
+        return key[0] if len(keys) == 1 else tuple_(*key)
+
+    if before_key is not None and len(before_key) == len(keys):
+        rows = (
+            query.filter(expr < bind(before_key))
+            .order_by(*[k.desc() for k in keys])
+            .limit(per_page + 1)
+            .all()
+        )
+        has_more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_prev, has_next = has_more, True
+    else:
+        if after_key is not None and len(after_key) == len(keys):
+            query = query.filter(expr > bind(after_key))
+        else:
+            after_key = None
+        rows = query.order_by(*keys).limit(per_page + 1).all()
+        items = rows[:per_page]
+        has_prev, has_next = after_key is not None, len(rows) > per_page
+
+    next_cursor = encode_cursor(key_of(items[-1])) if items and has_next else None
+    prev_cursor = encode_cursor(key_of(items[0])) if items and has_prev else None
+    return Page(items, next_cursor, prev_cursor, per_page)
@@ -0,0 +1,85 @@
+"""
+In-process cache of reference data: teachers, courses, the lower-cased
+teacher name map used by login and the tid map behind the per-request
+login identity.
+
+Dropdown pages and login read from memory instead of the DB. Routes that
+write teachers or courses call ``invalidate()`` after committing. Other
+worker processes cannot see that call, so after DPMS_REFDATA_TTL seconds
+(default 30) a lookup re-checks the teacher/course table versions with one
+small query and reloads only if they moved.
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+
+from models import db, Teacher, Course
+import cache
+
+TeacherRef = namedtuple("TeacherRef", "tid teacher_name")
+CourseRef = namedtuple("CourseRef", "course_code course_name credit sem")
+
+TTL = float(os.environ.get("DPMS_REFDATA_TTL") or 30)
+TABLES = ("teacher", "course")
+
+
+class RefData:
+    def __init__(self, ttl=TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded = None     # (versions, teachers, courses, by_name, by_tid)
+        self._checked_at = 0.0
+
+    def _load(self, versions):
+        teachers = tuple(
+            TeacherRef(tid, name) for tid, name in
+            db.session.query(Teacher.tid, Teacher.teacher_name)
+            .order_by(Teacher.tid)
+        )
+        courses = tuple(
+            CourseRef(*row) for row in
+            db.session.query(
+                Course.course_code, Course.course_name, Course.credit, Course.sem
+            ).order_by(Course.course_code)
+        )
+        by_name = {}
+        for t in teachers:
+            by_name.setdefault(t.teacher_name.strip().lower(), t)
+        by_tid = {str(t.tid): t for t in teachers}
+        return versions, teachers, courses, by_name, by_tid
+
+    def _data(self):
+        now = time.monotonic()
+        with self._lock:
+            loaded = self._loaded
+            if loaded is not None and now - self._checked_at < self.ttl:
+                return loaded
+
+        versions = cache.versions(*TABLES)
+        if loaded is None or loaded[0] != versions:
+            loaded = self._load(versions)
+        with self._lock:
+            self._loaded = loaded
+            self._checked_at = now
+        return loaded
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = None
+
+    def teachers(self):
+        return self._data()[1]
+
+    def courses(self):
+        return self._data()[2]
+
+    def teacher_by_name(self, name):
+        """Case-insensitive exact name match, or None."""
+        return self._data()[3].get((name or "").strip().lower())
+
+    def teacher(self, tid):
+        return self._data()[4].get(str(tid)) if tid is not None else None
+
+
+refdata = RefData()
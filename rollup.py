@@ -0,0 +1,306 @@
+"""
+Per-student rollups.
+
+``student_rollup`` holds one summary row per student: courses taken, how
+many are scored, the credit-weighted average (``Course.credit``), band
+counts and the number of courses with a supplementary assigned. The
+student page and the semester / section rankings read it instead of
+re-joining marks, course and supplementary for every request.
+
+The row is kept current by triggers inside the writing transaction. A
+marks insert / update / delete applies its difference to the student's
+counters, like the dashboard_stats triggers, so a bulk load costs O(1) per
+row. Rarer changes (a student's section, a supplementary, a course's
+credit, a marks row moved to another usn) re-aggregate just the students
+affected.
+Marks for a course with no credit recorded (or no course row at all) weigh
+DEFAULT_CREDIT, so every scored student has an average and a rank.
+
+    flask rollup rebuild    recompute every row from the base tables
+    flask rollup check      list students whose row has drifted
+"""
+import click
+from sqlalchemy import func, text
+
+from models import db, Student, StudentRollup
+
+DEFAULT_CREDIT = 1
+CREDIT = f"COALESCE(c.credit, {DEFAULT_CREDIT})"
+AVERAGE = "CASE WHEN credits > 0 THEN ROUND(weighted_sum * 1.0 / credits, 2) END"
+
+COLUMNS = (
+    "usn, sem, section, courses, scored, credits, weighted_sum, weighted_avg, "
+    "green, yellow, red, supplementary"
+)
+
+
+def _aggregate(where):
+    """SELECT of live rollup rows for the students matching ``where``."""
+    return f"""
+        SELECT usn, sem, section, courses, scored, credits, weighted_sum,
+               {AVERAGE}, green, yellow, red, supplementary
+        FROM (
+            SELECT s.usn, s.sem, s.section,
+                   COUNT(m.course_code) AS courses,
+                   COUNT(m.total_score) AS scored,
+                   COALESCE(SUM(CASE WHEN m.total_score IS NOT NULL
+                                     THEN {CREDIT} END), 0) AS credits,
+                   COALESCE(SUM(m.total_score * {CREDIT}), 0) AS weighted_sum,
+                   COALESCE(SUM(m.category IS 'green'), 0) AS green,
+                   COALESCE(SUM(m.category IS 'yellow'), 0) AS yellow,
+                   COALESCE(SUM(m.category IS 'red'), 0) AS red,
+                   (SELECT COUNT(DISTINCT p.course_code) FROM supplementary p
+                    WHERE p.usn = s.usn) AS supplementary
+            FROM student s
+            LEFT JOIN marks m ON m.usn = s.usn
+            LEFT JOIN course c ON c.course_code = m.course_code
+            WHERE {where}
+            GROUP BY s.usn
+        )"""
+
+
+def _refresh(usns):
+    # DELETE + INSERT rather than INSERT OR REPLACE: inside a trigger the
+    # outer statement's conflict clause (e.g. an importer's OR IGNORE)
+    # would override ours
+    return f"""
+        DELETE FROM student_rollup WHERE usn IN ({usns});
+        INSERT INTO student_rollup ({COLUMNS}) {_aggregate(f"s.usn IN ({usns})")};"""
+
+
+def _counters(add=None, remove=None):
+    """
+    UPDATE applying one marks row's contribution: ``add`` / ``remove`` are
+    "NEW" / "OLD". The average is derived in a second UPDATE since SQLite
+    evaluates every SET expression against the row before the update.
+    """
+    def delta(term):
+        parts = []
+        if add:
+            parts.append("+ " + term.format(p=add))
+        if remove:
+            parts.append("- " + term.format(p=remove))
+        return " ".join(parts)
+
+    credit = ("COALESCE((SELECT credit FROM course "
+              f"WHERE course_code = {{p}}.course_code), {DEFAULT_CREDIT})")
+    sets = []
+    if not (add and remove):
+        sets.append(f"courses = courses {delta('1')}")
+    sets += [
+        f"scored = scored {delta('({p}.total_score IS NOT NULL)')}",
+        f"credits = credits {delta(f'({{p}}.total_score IS NOT NULL) * {credit}')}",
+        f"weighted_sum = weighted_sum {delta(f'COALESCE({{p}}.total_score * {credit}, 0)')}",
+    ]
+    sets += [f"{band} = {band} {delta(f'({{p}}.category IS {band!r})')}"
+             for band in ("green", "yellow", "red")]
+    usn = f"{add or remove}.usn"
+    sets = ",\n            ".join(sets)
+    return f"""
+        UPDATE student_rollup SET
+            {sets}
+        WHERE usn = {usn};
+        UPDATE student_rollup SET weighted_avg = {AVERAGE}
+        WHERE usn = {usn};"""
+
+
+def _supplementary(usns):
+    return f"""
+        UPDATE student_rollup SET supplementary = (
+            SELECT COUNT(DISTINCT p.course_code) FROM supplementary p
+            WHERE p.usn = student_rollup.usn
+        )
+        WHERE usn IN ({usns});"""
+
+
+def _trigger(name, event, body, when=None):
+    return (
+        f"CREATE TRIGGER {name}\n{event}\n"
+        + (f"WHEN {when}\n" if when else "")
+        + f"BEGIN{body}\nEND"
+    )
+
+
+def trigger_ddl():
+    """DROP + CREATE statements for the rollup triggers."""
+    rekeyed = "OLD.usn IS NOT NEW.usn OR OLD.course_code IS NOT NEW.course_code"
+    # calc_category re-writes total/category with the same values on every
+    # insert; the WHEN skips that second pass
+    rescored = (f"NOT ({rekeyed}) AND (OLD.total_score IS NOT NEW.total_score"
+                " OR OLD.category IS NOT NEW.category)")
+    took_course = "SELECT usn FROM marks WHERE course_code IN ({})"
+    triggers = [
+        ("rollup_marks_insert", "AFTER INSERT ON marks",
+         _counters(add="NEW"), None),
+        ("rollup_marks_update", "AFTER UPDATE ON marks",
+         _counters(add="NEW", remove="OLD"), rescored),
+        ("rollup_marks_rekey", "AFTER UPDATE OF usn, course_code ON marks",
+         _refresh("OLD.usn, NEW.usn"), rekeyed),
+        ("rollup_marks_delete", "AFTER DELETE ON marks",
+         _counters(remove="OLD"), None),
+        ("rollup_supplementary_insert", "AFTER INSERT ON supplementary",
+         _supplementary("NEW.usn"), None),
+        ("rollup_supplementary_update",
+         "AFTER UPDATE OF usn, course_code ON supplementary",
+         _supplementary("OLD.usn, NEW.usn"), None),
+        ("rollup_supplementary_delete", "AFTER DELETE ON supplementary",
+         _supplementary("OLD.usn"), None),
+        ("rollup_student_insert", "AFTER INSERT ON student",
+         _refresh("NEW.usn"), None),
+        ("rollup_student_update", "AFTER UPDATE OF usn, sem, section ON student",
+         _refresh("OLD.usn, NEW.usn"), None),
+        ("rollup_student_delete", "AFTER DELETE ON student",
+         "\n        DELETE FROM student_rollup WHERE usn = OLD.usn;", None),
+        ("rollup_course_insert", "AFTER INSERT ON course",
+         _refresh(took_course.format("NEW.course_code")), None),
+        ("rollup_course_update", "AFTER UPDATE OF course_code, credit ON course",
+         _refresh(took_course.format("OLD.course_code, NEW.course_code")),
+         "OLD.course_code IS NOT NEW.course_code OR OLD.credit IS NOT NEW.credit"),
+        ("rollup_course_delete", "AFTER DELETE ON course",
+         _refresh(took_course.format("OLD.course_code")), None),
+    ]
+    ddl = [f"DROP TRIGGER IF EXISTS {name}" for name, _, _, _ in triggers]
+    ddl += [_trigger(*t) for t in triggers]
+    return ddl
+
+
+def install_triggers():
+    """(Re)create the rollup triggers. Caller commits."""
+    for sql in trigger_ddl():
+        db.session.execute(text(sql))
+
+
+def rebuild():
+    """Recompute every rollup row. Caller commits."""
+    db.session.execute(text("DELETE FROM student_rollup"))
+    db.session.execute(text(
+        f"INSERT INTO student_rollup ({COLUMNS}) {_aggregate('1')}"
+    ))
+
+
+def check():
+    """USNs whose stored rollup differs from the live aggregate."""
+    rows = db.session.execute(text(f"""
+        SELECT usn FROM (
+            SELECT * FROM ({_aggregate('1')})
+            EXCEPT SELECT {COLUMNS} FROM student_rollup
+        )
+        UNION
+        SELECT usn FROM (
+            SELECT {COLUMNS} FROM student_rollup
+            EXCEPT SELECT * FROM ({_aggregate('1')})
+        )
+        ORDER BY usn
+    """))
+    return [usn for (usn,) in rows]
+
+
+# ---------------------------------------------------
+# QUERIES
+# ---------------------------------------------------
+def get(usn):
+    """(StudentRollup, student_name) for one student, or None."""
+    return (
+        db.session.query(StudentRollup, Student.student_name)
+        .join(Student, Student.usn == StudentRollup.usn)
+        .filter(StudentRollup.usn == usn)
+        .first()
+    )
+
+
+def rank_of(rollup):
+    """
+    (rank, out_of) of a student within their semester and section, or
+    None if they have no weighted average yet. Two range counts on
+    ix_student_rollup_rank.
+    """
+    if rollup.weighted_avg is None:
+        return None
+    peers = StudentRollup.query.filter(
+        StudentRollup.sem == rollup.sem,
+        StudentRollup.section == rollup.section,
+        StudentRollup.weighted_avg.isnot(None),
+    )
+    ahead = peers.filter(StudentRollup.weighted_avg > rollup.weighted_avg).count()
+    return ahead + 1, peers.count()
+
+
+def ranking_query(sem, section=None, limit=None):
+    """The query behind ``ranking()``, not yet run."""
+    query = (
+        db.session.query(
+            func.rank().over(order_by=StudentRollup.weighted_avg.desc())
+            .label("rank"),
+            StudentRollup,
+            Student.student_name,
+        )
+        .join(Student, Student.usn == StudentRollup.usn)
+        .filter(StudentRollup.sem == sem,
+                StudentRollup.weighted_avg.isnot(None))
+        .order_by(StudentRollup.weighted_avg.desc(), StudentRollup.usn)
+    )
+    if section:
+        query = query.filter(StudentRollup.section == section)
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+def ranking(sem, section=None, limit=None):
+    """
+    Students of a semester (or one section of it) ordered by weighted
+    average, with a competition rank (ties share a rank). Students with no
+    scored course yet are left out.
+    """
+    return ranking_query(sem, section, limit).all()
+
+
+def as_dict(rollup, student_name=None, rank=None):
+    out = {
+        "usn": rollup.usn,
+        "student_name": student_name,
+        "sem": rollup.sem,
+        "section": rollup.section,
+        "courses": rollup.courses,
+        "scored": rollup.scored,
+        "credits": rollup.credits,
+        "weighted_avg": rollup.weighted_avg,
+        "bands": {
+            "green": rollup.green,
+            "yellow": rollup.yellow,
+            "red": rollup.red,
+        },
+        "supplementary": rollup.supplementary,
+    }
+    if rank is not None:
+        out["rank"] = rank
+    return out
+
+
+# ---------------------------------------------------
+# CLI:  flask rollup rebuild | flask rollup check
+# ---------------------------------------------------
+@click.group("rollup")
+def rollup_cli():
+    """Per-student rollup maintenance."""
+
+
+@rollup_cli.command("rebuild")
+def rebuild_command():
+    """Recompute every student's rollup from the base tables."""
+    rebuild()
+    db.session.commit()
+    n = db.session.query(func.count()).select_from(StudentRollup).scalar()
+    click.echo(f"Rebuilt {n} student rollup(s).")
+
+
+@rollup_cli.command("check")
+def check_command():
+    """Compare stored rollups with live aggregates."""
+    drift = check()
+    if not drift:
+        click.echo("Student rollups are consistent.")
+        return
+    for usn in drift:
+        click.echo(f"drifted: {usn}")
+    raise SystemExit(1)
@@ -0,0 +1,141 @@
+"""
+Score / band engine.
+
+One definition of how IA marks become ``total_score`` and a band, used by
+every write path in Python, by the calc_category triggers (DDL rendered
+from the same constants, see triggers.sql) and by the bulk recompute,
+which re-bands the whole marks table with a single UPDATE ... CASE.
+
+total_score = (ia1 + ia2 + ia3) / 3 + assignment   (integer division)
+band        = red < RED_BELOW <= yellow < YELLOW_BELOW <= green
+
+After changing the thresholds run ``flask scores install-triggers`` and
+``flask scores recompute``.
+"""
+import click
+from sqlalchemy import text
+
+from models import db
+
+RED_BELOW = 20
+YELLOW_BELOW = 40
+
+
+def score(ia1, ia2, ia3, assignment):
+    """Return (total_score, category) for one row of marks."""
+    total = ((ia1 or 0) + (ia2 or 0) + (ia3 or 0)) // 3 + (assignment or 0)
+    return total, band(total)
+
+
+def band(total):
+    if total < RED_BELOW:
+        return "red"
+    if total < YELLOW_BELOW:
+        return "yellow"
+    return "green"
+
+
+def apply(marks):
+    """Set total_score / category on a Marks object from its IA fields."""
+    marks.total_score, marks.category = score(
+        marks.ia1, marks.ia2, marks.ia3, marks.assignment
+    )
+    return marks
+
+
+# ---------------------------------------------------
+# SQL rendering (shared by triggers and the bulk recompute)
+# ---------------------------------------------------
+def total_sql(prefix=""):
+    p = prefix
+    return (
+        f"((COALESCE({p}ia1, 0) + COALESCE({p}ia2, 0) + COALESCE({p}ia3, 0)) / 3)"
+        f" + COALESCE({p}assignment, 0)"
+    )
+
+
+def category_sql(total):
+    return (
+        f"CASE WHEN {total} < {RED_BELOW} THEN 'red'"
+        f" WHEN {total} < {YELLOW_BELOW} THEN 'yellow'"
+        f" ELSE 'green' END"
+    )
+
+
+def trigger_ddl():
+    """DROP + CREATE statements for the calc_category triggers."""
+    total = total_sql("NEW.")
+    body = f"""
+BEGIN
+    UPDATE marks
+    SET
+        total_score = {total},
+        category = {category_sql(total)}
+    WHERE usn = NEW.usn AND course_code = NEW.course_code;
+END"""
+    return [
+        "DROP TRIGGER IF EXISTS calc_category_after_insert",
+        "DROP TRIGGER IF EXISTS calc_category_after_update",
+        "CREATE TRIGGER calc_category_after_insert\n"
+        "AFTER INSERT ON marks\nFOR EACH ROW" + body,
+        # only fire when an input column changed, not on our own UPDATE
+        "CREATE TRIGGER calc_category_after_update\n"
+        "AFTER UPDATE OF ia1, ia2, ia3, assignment ON marks\nFOR EACH ROW" + body,
+    ]
+
+
+def install_triggers():
+    """(Re)create the calc_category triggers from the constants. Caller commits."""
+    for sql in trigger_ddl():
+        db.session.execute(text(sql))
+
+
+def recompute_all():
+    """
+    Re-score every marks row with one set-based UPDATE and return the
+    number of rows whose total or band changed. Caller commits.
+    """
+    total = total_sql()
+    category = category_sql(total)
+    result = db.session.execute(text(f"""
+        UPDATE marks
+        SET total_score = {total},
+            category = {category}
+        WHERE total_score IS NOT {total}
+           OR category IS NOT {category}
+    """))
+    return result.rowcount
+
+
+# ---------------------------------------------------
+# CLI:  flask scores recompute | install-triggers | dump-triggers
+# ---------------------------------------------------
+@click.group("scores")
+def scores_cli():
+    """Score / band maintenance."""
+
+
+@scores_cli.command("recompute")
+def recompute_command():
+    """Re-score and re-band every marks row in one statement."""
+    changed = recompute_all()
+    db.session.commit()
+    click.echo(f"{changed} marks row(s) re-scored.")
+
+
+@scores_cli.command("install-triggers")
+def install_triggers_command():
+    """Recreate the calc_category and marks_log triggers from scoring.py."""
+    import changelog  # imports this module
+
+    install_triggers()
+    changelog.install_triggers()
+    db.session.commit()
+    click.echo("calc_category and marks_log triggers installed.")
+
+
+@scores_cli.command("dump-triggers")
+def dump_triggers_command():
+    """Print the trigger DDL (this is what triggers.sql contains)."""
+    for sql in trigger_ddl():
+        click.echo(sql + ";\n")
@@ -0,0 +1,241 @@
+"""
+Full-text search over students, teachers and courses.
+
+``search_fts`` is an FTS5 table with the trigram tokenizer, so any 3+
+character fragment of a name, USN, tid or course code matches, not just
+whole words. Its rowids come from ``search_key`` (kind, key) because the
+source tables have TEXT primary keys whose implicit rowids are not stable.
+Triggers on student / teacher / course keep both in sync inside the
+writing transaction.
+
+Results are ranked prefix matches first, then by bm25. If the exact
+fragment matches nothing, the query falls back to OR-ing its trigrams,
+which still finds names with a typo or two. Queries shorter than three
+characters use a plain prefix LIKE.
+
+    flask search rebuild    refill the index from the source tables
+"""
+import click
+from sqlalchemy import text
+
+from models import db
+
+KINDS = ("student", "teacher", "course")
+MIN_FTS = 3     # the trigram tokenizer cannot match anything shorter
+MAX_LIMIT = 50
+# the fuzzy fallback skips trigrams found in more than this share of rows
+FUZZY_MAX_SHARE = 0.02
+
+# kind -> (table, key column, title column, detail expression)
+SOURCES = {
+    "student": ("student", "usn", "student_name",
+                "{p}usn || ' sem ' || COALESCE({p}sem, '') || ' ' || COALESCE({p}section, '')"),
+    "teacher": ("teacher", "tid", "teacher_name", "{p}tid"),
+    "course": ("course", "course_code", "course_name", "{p}course_code"),
+}
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS search_key (
+        id INTEGER PRIMARY KEY,
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        UNIQUE (kind, key)
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_fts
+    USING fts5(title, detail, tokenize = 'trigram')
+    """,
+    # per-trigram document counts, used to pick the fuzzy query's terms
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_vocab
+    USING fts5vocab(search_fts, 'row')
+    """,
+]
+
+
+def _add_sql(kind, p):
+    table, key, title, detail = SOURCES[kind]
+    return f"""
+        INSERT OR IGNORE INTO search_key (kind, key) VALUES ('{kind}', {p}{key});
+        INSERT INTO search_fts (rowid, title, detail) VALUES (
+            (SELECT id FROM search_key WHERE kind = '{kind}' AND key = {p}{key}),
+            {p}{title}, {detail.format(p=p)}
+        );"""
+
+
+def _remove_sql(kind, p):
+    table, key, _, _ = SOURCES[kind]
+    return f"""
+        DELETE FROM search_fts WHERE rowid =
+            (SELECT id FROM search_key WHERE kind = '{kind}' AND key = {p}{key});
+        DELETE FROM search_key WHERE kind = '{kind}' AND key = {p}{key};"""
+
+
+def trigger_ddl():
+    ddl = []
+    for kind, (table, _, _, _) in SOURCES.items():
+        ddl.append(f"""
+        CREATE TRIGGER IF NOT EXISTS search_{kind}_insert
+        AFTER INSERT ON {table}
+        BEGIN{_add_sql(kind, "NEW.")}
+        END""")
+        ddl.append(f"""
+        CREATE TRIGGER IF NOT EXISTS search_{kind}_update
+        AFTER UPDATE ON {table}
+        BEGIN{_remove_sql(kind, "OLD.")}{_add_sql(kind, "NEW.")}
+        END""")
+        ddl.append(f"""
+        CREATE TRIGGER IF NOT EXISTS search_{kind}_delete
+        AFTER DELETE ON {table}
+        BEGIN{_remove_sql(kind, "OLD.")}
+        END""")
+    return ddl
+
+
+def install():
+    """Create the index tables and triggers. Caller commits."""
+    for ddl in TABLES + trigger_ddl():
+        db.session.execute(text(ddl))
+
+
+def rebuild():
+    """Refill the index from the source tables. Caller commits."""
+    db.session.execute(text("DELETE FROM search_fts"))
+    db.session.execute(text("DELETE FROM search_key"))
+    for kind, (table, key, title, detail) in SOURCES.items():
+        db.session.execute(text(
+            f"INSERT INTO search_key (kind, key) SELECT '{kind}', {key} FROM {table}"
+        ))
+        db.session.execute(text(f"""
+            INSERT INTO search_fts (rowid, title, detail)
+            SELECT k.id, t.{title}, {detail.format(p='t.')}
+            FROM {table} t
+            JOIN search_key k ON k.kind = '{kind}' AND k.key = t.{key}
+        """))
+
+
+# ---------------------------------------------------
+# QUERY
+# ---------------------------------------------------
+def _phrase(s):
+    return '"' + s.replace('"', '""') + '"'
+
+
+def _fuzzy_match(q):
+    """
+    OR of the query's distinctive trigrams. Common ones ("stu", "an ")
+    would match most of the index and only slow the bm25 sort down.
+    """
+    q = q.lower()
+    grams = sorted({q[i:i + 3] for i in range(len(q) - 2)} - {"   "})
+    names = [f"g{i}" for i in range(len(grams))]
+    docs = dict(db.session.execute(
+        text(f"SELECT term, doc FROM search_vocab "
+             f"WHERE term IN ({', '.join(':' + n for n in names)})"),
+        dict(zip(names, grams))
+    ).all())
+    if not docs:
+        return None
+
+    total = db.session.execute(text("SELECT COUNT(*) FROM search_key")).scalar()
+    cutoff = max(total * FUZZY_MAX_SHARE, 50)
+    keep = [g for g in docs if docs[g] <= cutoff]
+    if not keep:
+        keep = sorted(docs, key=docs.get)[:3]
+    return " OR ".join(_phrase(g) for g in sorted(keep))
+
+
+# title or detail starts with :prefix (built by _like_prefix)
+STARTS_WITH = ("(f.title LIKE :prefix ESCAPE '\\' "
+               "OR f.detail LIKE :prefix ESCAPE '\\')")
+
+
+def _like_prefix(q):
+    """LIKE pattern for "starts with ``q``", its wildcards escaped."""
+    for ch in ("\\", "%", "_"):
+        q = q.replace(ch, "\\" + ch)
+    return q + "%"
+
+
+def _kind_filter(kinds):
+    if not kinds:
+        return "", {}
+    names = [f"k{i}" for i in range(len(kinds))]
+    return (f" AND k.kind IN ({', '.join(':' + n for n in names)})",
+            dict(zip(names, kinds)))
+
+
+def _fts(match, q, kinds, limit):
+    where, params = _kind_filter(kinds)
+    rows = db.session.execute(text(f"""
+        SELECT k.kind, k.key, f.title, f.detail
+        FROM search_fts f
+        JOIN search_key k ON k.id = f.rowid
+        WHERE search_fts MATCH :match{where}
+        ORDER BY {STARTS_WITH} DESC,
+                 bm25(search_fts)
+        LIMIT :limit
+    """), dict(params, match=match, prefix=_like_prefix(q), limit=limit))
+    return rows.all()
+
+
+def _prefix(q, kinds, limit):
+    where, params = _kind_filter(kinds)
+    rows = db.session.execute(text(f"""
+        SELECT k.kind, k.key, f.title, f.detail
+        FROM search_fts f
+        JOIN search_key k ON k.id = f.rowid
+        WHERE {STARTS_WITH}{where}
+        ORDER BY f.title
+        LIMIT :limit
+    """), dict(params, prefix=_like_prefix(q), limit=limit))
+    return rows.all()
+
+
+def search(q, kinds=None, limit=20):
+    """
+    Return (results, fuzzy) for ``q``. Each result is a dict with kind,
+    key, title and detail; ``fuzzy`` is True if the trigram fallback ran.
+    """
+    q = (q or "").strip()
+    limit = max(1, min(limit, MAX_LIMIT))
+    kinds = [k for k in (kinds or ()) if k in KINDS]
+    if not q:
+        return [], False
+
+    fuzzy = False
+    if len(q) < MIN_FTS:
+        rows = _prefix(q, kinds, limit)
+    else:
+        rows = _fts(_phrase(q), q, kinds, limit)
+        if not rows:
+            match = _fuzzy_match(q)
+            rows = _fts(match, q, kinds, limit) if match else []
+            fuzzy = True
+
+    results = [
+        {"kind": kind, "key": key, "title": title, "detail": detail}
+        for kind, key, title, detail in rows
+    ]
+    return results, fuzzy
+
+
+# ---------------------------------------------------
+# CLI:  flask search rebuild
+# ---------------------------------------------------
+@click.group("search")
+def search_cli():
+    """Search index maintenance."""
+
+
+@search_cli.command("rebuild")
+def rebuild_command():
+    """Refill the search index from student, teacher and course."""
+    rebuild()
+    db.session.commit()
+    counts = db.session.execute(
+        text("SELECT kind, COUNT(*) FROM search_key GROUP BY kind")
+    ).all()
+    click.echo(", ".join(f"{n} {kind}(s)" for kind, n in counts) or "empty")
@@ -0,0 +1,212 @@
+"""
+Server-side sessions and the per-request login identity.
+
+Flask's default session signs the whole dict into the cookie and
+re-serializes it on every response that touches it. Here the cookie only
+carries a random session id and the data lives in a backend:
+
+    sqlite   web_session table, shared by every worker process (default)
+    memory   in-process LRU with TTL, for a single-process deployment
+    cookie   Flask's signed cookie session, unchanged
+
+A session is written back only when it changed or is past half its idle
+lifetime, and the cookie is only sent when the id is new. Requests for
+static files never load a session at all.
+
+    DPMS_SESSION_BACKEND   sqlite | memory | cookie
+    DPMS_SESSION_TTL       idle lifetime in seconds (default 8 hours)
+"""
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask import session
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from sqlalchemy import delete, insert, select
+from werkzeug.datastructures import CallbackDict
+
+from models import WebSession
+from refdata import refdata, TeacherRef
+
+BACKEND = os.environ.get("DPMS_SESSION_BACKEND") or "sqlite"
+TTL = int(os.environ.get("DPMS_SESSION_TTL") or 8 * 3600)
+MEMORY_MAX = 10000
+PRUNE_EVERY = 200       # saves between sweeps of expired rows
+
+
+def new_sid():
+    return secrets.token_urlsafe(32)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, expires_at=0.0, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid or new_sid()
+        self.expires_at = expires_at
+        self.new = new
+        self.modified = False
+        self.stale_sid = None
+
+    def rotate(self):
+        """Move the data to a fresh sid (on login, against fixation)."""
+        if not self.new:
+            self.stale_sid = self.sid
+        self.sid = new_sid()
+        self.new = True
+        self.modified = True
+
+
+# ---------------------------------------------------
+# STORES
+# load(sid) -> (data, expires_at) or None; save(sid, data, expires_at);
+# delete(sid). data is the serialized session string.
+# ---------------------------------------------------
+class MemoryStore:
+    def __init__(self, maxsize=MEMORY_MAX):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            hit = self._data.get(sid)
+            if hit is None:
+                return None
+            if hit[1] < time.time():
+                del self._data[sid]
+                return None
+            self._data.move_to_end(sid)
+            return hit
+
+    def save(self, sid, data, expires_at):
+        with self._lock:
+            self._data[sid] = (data, expires_at)
+            self._data.move_to_end(sid)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+class SQLStore:
+    # uses its own engine connection so a session write never commits (or
+    # gets rolled back with) the request's ORM transaction
+    def __init__(self, db):
+        self.db = db
+        self._saves = 0
+
+    def load(self, sid):
+        with self.db.engine.connect() as conn:
+            row = conn.execute(
+                select(WebSession.data, WebSession.expires_at)
+                .where(WebSession.sid == sid)
+            ).first()
+        if row is None or row.expires_at < time.time():
+            return None
+        return row.data, row.expires_at
+
+    def save(self, sid, data, expires_at):
+        self._saves += 1
+        with self.db.engine.begin() as conn:
+            conn.execute(delete(WebSession).where(WebSession.sid == sid))
+            conn.execute(insert(WebSession).values(
+                sid=sid, data=data, expires_at=expires_at
+            ))
+            if self._saves % PRUNE_EVERY == 0:
+                conn.execute(
+                    delete(WebSession).where(WebSession.expires_at < time.time())
+                )
+
+    def delete(self, sid):
+        with self.db.engine.begin() as conn:
+            conn.execute(delete(WebSession).where(WebSession.sid == sid))
+
+
+class ServerSessionInterface(SessionInterface):
+    serializer = session_json_serializer
+
+    def __init__(self, store, ttl=TTL):
+        self.store = store
+        self.ttl = ttl
+
+    def open_session(self, app, request):
+        if app.static_url_path and request.path.startswith(app.static_url_path + "/"):
+            return self.make_null_session(app)
+
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            hit = self.store.load(sid)
+            if hit is not None:
+                data, expires_at = hit
+                return ServerSession(self.serializer.loads(data), sid, expires_at)
+        return ServerSession(new=True)
+
+    def save_session(self, app, session, response):
+        if self.is_null_session(session):
+            return
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.stale_sid:
+            self.store.delete(session.stale_sid)
+
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        if session.modified or session.expires_at - now < self.ttl / 2:
+            self.store.save(
+                session.sid, self.serializer.dumps(dict(session)), now + self.ttl
+            )
+        if session.new:
+            response.set_cookie(
+                name, session.sid,
+                httponly=self.get_cookie_httponly(app),
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+                domain=domain, path=path,
+            )
+            response.vary.add("Cookie")
+
+
+def rotate():
+    """Give the current session a new id, if the backend supports it."""
+    if isinstance(session, ServerSession):
+        session.rotate()
+
+
+def current_teacher():
+    """
+    The logged-in teacher, resolved from the in-memory reference data, or
+    None. Falls back to the name in the session if the teacher row is gone
+    from the cache (e.g. just added in another process).
+    """
+    name = session.get("teacher_name")
+    if not name:
+        return None
+    tid = session.get("tid")
+    return refdata.teacher(tid) or TeacherRef(tid, name)
+
+
+def init_app(app, db):
+    backend = app.config.setdefault("SESSION_BACKEND", BACKEND)
+    if backend == "cookie":
+        return
+    if backend == "memory":
+        store = MemoryStore()
+    elif backend == "sqlite":
+        store = SQLStore(db)
+    else:
+        raise ValueError(f"unknown session backend: {backend}")
+    app.session_interface = ServerSessionInterface(store)
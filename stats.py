@@ -0,0 +1,235 @@
+"""
+Dashboard statistics.
+
+The dashboard and band analysis pages read one row of ``dashboard_stats``
+instead of scanning ``marks`` on every request. The row is kept current by
+SQLite triggers on student / teacher / marks / supplementary, so every write
+path (ORM routes, bulk statements and the calc_category trigger itself)
+updates the counters inside its own transaction.
+
+If the counters ever drift (e.g. rows edited with triggers dropped),
+``flask stats check`` reports it and ``flask stats rebuild`` recomputes them.
+"""
+import click
+from sqlalchemy import func, case, text
+
+from models import db, Student, Teacher, Marks, Supplementary, DashboardStats
+
+STATS_ID = 1
+
+COUNTER_FIELDS = (
+    "total_students", "total_teachers", "marks_count", "scored_count",
+    "score_sum", "green", "yellow", "red", "supp_count",
+)
+
+# NB: "x IS 'green'" yields 0/1 even when x is NULL, "=" would yield NULL
+# and poison the counter.
+TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS stats_student_insert
+    AFTER INSERT ON student
+    BEGIN
+        UPDATE dashboard_stats SET total_students = total_students + 1
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS stats_student_delete
+    AFTER DELETE ON student
+    BEGIN
+        UPDATE dashboard_stats SET total_students = total_students - 1
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS stats_teacher_insert
+    AFTER INSERT ON teacher
+    BEGIN
+        UPDATE dashboard_stats SET total_teachers = total_teachers + 1
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS stats_teacher_delete
+    AFTER DELETE ON teacher
+    BEGIN
+        UPDATE dashboard_stats SET total_teachers = total_teachers - 1
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS stats_marks_insert
+    AFTER INSERT ON marks
+    BEGIN
+        UPDATE dashboard_stats SET
+            marks_count = marks_count + 1,
+            scored_count = scored_count + (NEW.total_score IS NOT NULL),
+            score_sum = score_sum + COALESCE(NEW.total_score, 0),
+            green = green + (NEW.category IS 'green'),
+            yellow = yellow + (NEW.category IS 'yellow'),
+            red = red + (NEW.category IS 'red')
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS stats_marks_update
+    AFTER UPDATE ON marks
+    BEGIN
+        UPDATE dashboard_stats SET
+            scored_count = scored_count
+                + (NEW.total_score IS NOT NULL) - (OLD.total_score IS NOT NULL),
+            score_sum = score_sum
+                + COALESCE(NEW.total_score, 0) - COALESCE(OLD.total_score, 0),
+            green = green
+                + (NEW.category IS 'green') - (OLD.category IS 'green'),
+            yellow = yellow
+                + (NEW.category IS 'yellow') - (OLD.category IS 'yellow'),
+            red = red
+                + (NEW.category IS 'red') - (OLD.category IS 'red')
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS stats_marks_delete
+    AFTER DELETE ON marks
+    BEGIN
+        UPDATE dashboard_stats SET
+            marks_count = marks_count - 1,
+            scored_count = scored_count - (OLD.total_score IS NOT NULL),
+            score_sum = score_sum - COALESCE(OLD.total_score, 0),
+            green = green - (OLD.category IS 'green'),
+            yellow = yellow - (OLD.category IS 'yellow'),
+            red = red - (OLD.category IS 'red')
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS stats_supplementary_insert
+    AFTER INSERT ON supplementary
+    BEGIN
+        UPDATE dashboard_stats SET supp_count = supp_count + 1
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS stats_supplementary_delete
+    AFTER DELETE ON supplementary
+    BEGIN
+        UPDATE dashboard_stats SET supp_count = supp_count - 1
+        WHERE id = 1;
+    END
+    """,
+]
+
+
+def install():
+    """
+    Create the stats triggers and seed the counters row if missing.
+    Run by migration 1 (see migrations.py); caller commits.
+    """
+    for ddl in TRIGGERS:
+        db.session.execute(text(ddl))
+    if db.session.get(DashboardStats, STATS_ID) is None:
+        rebuild()
+
+
+def live_counts():
+    """Recompute every counter from the base tables (one pass over marks)."""
+    marks = db.session.query(
+        func.count(),
+        func.count(Marks.total_score),
+        func.coalesce(func.sum(Marks.total_score), 0),
+        func.coalesce(func.sum(case((Marks.category == "green", 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Marks.category == "yellow", 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Marks.category == "red", 1), else_=0)), 0),
+    ).one()
+
+    return {
+        "total_students": db.session.query(func.count(Student.usn)).scalar(),
+        "total_teachers": db.session.query(func.count(Teacher.tid)).scalar(),
+        "marks_count": marks[0],
+        "scored_count": marks[1],
+        "score_sum": float(marks[2]),
+        "green": marks[3],
+        "yellow": marks[4],
+        "red": marks[5],
+        "supp_count": db.session.query(func.count()).select_from(Supplementary).scalar(),
+    }
+
+
+def rebuild():
+    """Overwrite the counters row with live aggregates. Caller commits."""
+    row = db.session.get(DashboardStats, STATS_ID)
+    if row is None:
+        row = DashboardStats(id=STATS_ID)
+        db.session.add(row)
+    for field, value in live_counts().items():
+        setattr(row, field, value)
+    db.session.flush()
+    return row
+
+
+def check():
+    """Return {field: (stored, live)} for every counter that has drifted."""
+    row = db.session.get(DashboardStats, STATS_ID)
+    live = live_counts()
+    drift = {}
+    for field in COUNTER_FIELDS:
+        stored = getattr(row, field) if row else None
+        if field == "score_sum" and stored is not None:
+            if abs(stored - live[field]) < 1e-6:
+                continue
+        elif stored == live[field]:
+            continue
+        drift[field] = (stored, live[field])
+    return drift
+
+
+def get():
+    """Dashboard numbers from the counters row: O(1), no scans."""
+    row = db.session.get(DashboardStats, STATS_ID)
+    if row is None:
+        row = rebuild()
+        db.session.commit()
+
+    avg_score = row.score_sum / row.scored_count if row.scored_count else 0
+
+    return {
+        "total_students": row.total_students,
+        "total_teachers": row.total_teachers,
+        "avg_score": round(avg_score, 2),
+        "supp_count": row.supp_count,
+        "band_counts": {
+            "green": row.green,
+            "yellow": row.yellow,
+            "red": row.red,
+        },
+    }
+
+
+# ---------------------------------------------------
+# CLI:  flask stats rebuild | flask stats check
+# ---------------------------------------------------
+@click.group("stats")
+def stats_cli():
+    """Dashboard counters maintenance."""
+
+
+@stats_cli.command("rebuild")
+def rebuild_command():
+    """Recompute dashboard counters from the base tables."""
+    rebuild()
+    db.session.commit()
+    click.echo("Dashboard stats rebuilt.")
+
+
+@stats_cli.command("check")
+def check_command():
+    """Compare stored counters with live aggregates."""
+    drift = check()
+    if not drift:
+        click.echo("Dashboard stats are consistent.")
+        return
+    for field, (stored, live) in drift.items():
+        click.echo(f"{field}: stored={stored} live={live}")
+    raise SystemExit(1)
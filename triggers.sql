@@ -0,0 +1,31 @@
+-- calc_category triggers: keep marks.total_score / marks.category in step
+-- with the IA columns for writes that bypass the app.
+-- Generated from scoring.py by: flask scores dump-triggers > triggers.sql
+-- (the app installs these itself via migrations; this file is for manual setup)
+
+DROP TRIGGER IF EXISTS calc_category_after_insert;
+
+DROP TRIGGER IF EXISTS calc_category_after_update;
+
+CREATE TRIGGER calc_category_after_insert
+AFTER INSERT ON marks
+FOR EACH ROW
+BEGIN
+    UPDATE marks
+    SET
+        total_score = ((COALESCE(NEW.ia1, 0) + COALESCE(NEW.ia2, 0) + COALESCE(NEW.ia3, 0)) / 3) + COALESCE(NEW.assignment, 0),
+        category = CASE WHEN ((COALESCE(NEW.ia1, 0) + COALESCE(NEW.ia2, 0) + COALESCE(NEW.ia3, 0)) / 3) + COALESCE(NEW.assignment, 0) < 20 THEN 'red' WHEN ((COALESCE(NEW.ia1, 0) + COALESCE(NEW.ia2, 0) + COALESCE(NEW.ia3, 0)) / 3) + COALESCE(NEW.assignment, 0) < 40 THEN 'yellow' ELSE 'green' END
+    WHERE usn = NEW.usn AND course_code = NEW.course_code;
+END;
+
+CREATE TRIGGER calc_category_after_update
+AFTER UPDATE OF ia1, ia2, ia3, assignment ON marks
+FOR EACH ROW
+BEGIN
+    UPDATE marks
+    SET
+        total_score = ((COALESCE(NEW.ia1, 0) + COALESCE(NEW.ia2, 0) + COALESCE(NEW.ia3, 0)) / 3) + COALESCE(NEW.assignment, 0),
+        category = CASE WHEN ((COALESCE(NEW.ia1, 0) + COALESCE(NEW.ia2, 0) + COALESCE(NEW.ia3, 0)) / 3) + COALESCE(NEW.assignment, 0) < 20 THEN 'red' WHEN ((COALESCE(NEW.ia1, 0) + COALESCE(NEW.ia2, 0) + COALESCE(NEW.ia3, 0)) / 3) + COALESCE(NEW.assignment, 0) < 40 THEN 'yellow' ELSE 'green' END
+    WHERE usn = NEW.usn AND course_code = NEW.course_code;
+END;
+
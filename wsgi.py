@@ -0,0 +1,19 @@
+"""
+Production entry point for a multi-process, multi-threaded WSGI server.
+
+    flask --app app db upgrade                 once per deploy
+    gunicorn -w 4 --threads 8 wsgi:app         e.g. one worker per core
+
+Workers do no schema work at startup (they refuse to start if the
+database is behind) and share cached reports through instance/cache.db
+(see cache.py). Sessions, job claims and the table_version counters live in
+the main database, so every worker sees the same state. Do not use
+gunicorn's --preload: the job runner's threads must start in each worker,
+not in the parent before it forks.
+"""
+import os
+
+from app import create_app
+
+os.environ.setdefault("DPMS_SHARED_CACHE", "cache.db")
+app = create_app(migrate=False)